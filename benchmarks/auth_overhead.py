@@ -0,0 +1,78 @@
+"""
+Per request cost of authentication in get_current_user for a token without
+profile claims (decode and user lookup), a token with claims verified cold
+(decode only) and the same token from the verified token cache.
+
+Runs in process against a throwaway sqlite database unless DB_* settings
+are given in the environment.
+
+    python -m benchmarks.auth_overhead --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault('DB_CONNECTION', 'sqlite')
+os.environ.setdefault('DB_NAME', os.path.join(tempfile.mkdtemp(), 'auth_overhead.db'))
+for key, value in {
+    'ACCESS_TOKEN_SECRET': 'auth-overhead',
+    'ALGORITHM': 'HS256',
+    'ACCESS_TOKEN_EXPIRE_MINUTES': '15',
+}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from database import Base, connection_string, get_db  # noqa: E402
+from middlewares import get_current_user  # noqa: E402
+from models.Snippet import Snippet  # noqa: E402, F401
+from models.User import User  # noqa: E402
+from utils import Auth  # noqa: E402
+
+
+def make_request(token):
+    return Request({
+        'type': 'http',
+        'headers': [(b'authorization', f'Bearer {token}'.encode())],
+    })
+
+
+async def measure(token, requests, cold=False):
+    request = make_request(token)
+    async for db in get_db():
+        started = time.perf_counter()
+        for _ in range(requests):
+            if cold:
+                Auth.verified_tokens.clear()
+            await get_current_user(request, db)
+        elapsed = time.perf_counter() - started
+    return elapsed / requests * 1e6
+
+
+async def main(args):
+    engine = create_engine(connection_string)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(name='Auth Overhead', username='authoverhead', email='auth@overhead.dev')
+        session.add(user)
+        session.commit()
+        legacy_token = Auth.create_access_token(data={'sub': user.email})
+        claims_token = Auth.create_access_token(data=Auth.user_claims(user))
+
+    print(f"{'path':<24} {'us/request':>10}")
+    for name, token, cold in (
+        ('lookup (sub only)', legacy_token, False),
+        ('claims, cold', claims_token, True),
+        ('claims, cached', claims_token, False),
+    ):
+        print(f'{name:<24} {await measure(token, args.requests, cold):>10.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
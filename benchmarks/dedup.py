@@ -0,0 +1,84 @@
+"""
+Dedup ratio of the snippet sources of the configured database. Every
+source is hashed to count the distinct ones, which gives the most that
+content-addressed storage could save, then the snippet_blobs table shows
+what it saves: the bytes of the sources pointing to a blob against the
+bytes of the distinct blobs, and against what they take compressed.
+Only sources of SNIPPETS_BLOB_MIN characters or more are stored in
+blobs, see services/blob_service.py.
+
+    DB_CONNECTION=sqlite DB_NAME=/tmp/load.db python -m benchmarks.seed --users 2000 --snippets 30000
+    DB_CONNECTION=sqlite DB_NAME=/tmp/load.db python -m migrations.snippet_blobs
+    DB_CONNECTION=sqlite DB_NAME=/tmp/load.db python -m migrations.source_compression
+    DB_CONNECTION=sqlite DB_NAME=/tmp/load.db python -m benchmarks.dedup
+"""
+import argparse
+from collections import Counter
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from database import connection_string
+from models.Snippet import Snippet
+from models.SnippetBlob import SnippetBlob
+from services import blob_service
+
+
+def hash_sources(session, batch):
+    # distinct sources and their size, whether stored inline or in a blob
+    counts = Counter()
+    sizes = {}
+    result = session.execute(
+        select(Snippet.source_code, Snippet.source_data, Snippet.byte_count)
+        .execution_options(yield_per=batch)
+    )
+    for row in result:
+        source_hash = blob_service.get_hash(Snippet.read_source(row.source_code, row.source_data))
+        counts[source_hash] += 1
+        sizes[source_hash] = row.byte_count
+    return counts, sizes
+
+
+def ratio(total, distinct):
+    return total / distinct if distinct else 1
+
+
+def main(args):
+    engine = create_engine(connection_string)
+    with Session(engine) as session:
+        counts, sizes = hash_sources(session, args.batch)
+        blobs, referenced, logical, distinct_blobs, stored = session.execute(
+            select(
+                func.count(SnippetBlob.hash),
+                func.sum(SnippetBlob.ref_count),
+                func.sum(SnippetBlob.byte_count * SnippetBlob.ref_count),
+                func.sum(SnippetBlob.byte_count),
+                func.sum(func.length(SnippetBlob.data)),
+            )
+            .where(SnippetBlob.ref_count > 0)
+        ).one()
+
+    snippets = sum(counts.values())
+    total = sum(sizes[source_hash] * count for source_hash, count in counts.items())
+    distinct = sum(sizes.values())
+    copied = sum(count - 1 for count in counts.values())
+    print(f'{snippets} snippets, {len(counts)} distinct sources, {copied / max(snippets, 1):.1%} copies')
+    print(
+        f'all sources: {total / 1e6:.1f} MB, {distinct / 1e6:.1f} MB distinct, '
+        f'dedup ratio {ratio(total, distinct):.2f}'
+    )
+    if not blobs:
+        print('no blobs stored, run migrations.source_compression')
+        return
+    print(
+        f'blobs: {referenced} snippets on {blobs} blobs, {logical / 1e6:.1f} MB of sources, '
+        f'{distinct_blobs / 1e6:.1f} MB distinct, {stored / 1e6:.1f} MB stored, '
+        f'dedup ratio {ratio(logical, distinct_blobs):.2f}, '
+        f'with compression {ratio(logical, stored):.2f}'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,134 @@
+"""
+In-memory stand-in for a Redis server, speaking just enough of the
+protocol for RESPONSE_CACHE=redis (strings and hashes with expiry), so
+the redis backend can be exercised without a real server.
+
+    python -m benchmarks.fake_redis --port 6390
+    REDIS_URL=redis://127.0.0.1:6390/0 RESPONSE_CACHE=redis uvicorn main:app
+"""
+import argparse
+import asyncio
+import time
+
+
+class FakeRedis:
+    def __init__(self):
+        # key -> value, bytes for strings and dicts for hashes
+        self.data = {}
+        self.expires = {}
+        self.commands = 0
+
+    def _alive(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def run(self, name, *args):
+        self.commands += 1
+        name = name.upper()
+        if name in ('PING', 'SELECT', 'AUTH'):
+            return b'PONG' if name == 'PING' else b'OK'
+        if name == 'GET':
+            return self.data[args[0]] if self._alive(args[0]) else None
+        if name == 'SET':
+            key, value = args[0], args[1]
+            self.data[key] = value
+            self.expires.pop(key, None)
+            if len(args) >= 4 and args[2].upper() == b'EX':
+                self.expires[key] = time.monotonic() + int(args[3])
+            return b'OK'
+        if name == 'DEL':
+            deleted = 0
+            for key in args:
+                deleted += self._alive(key)
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return deleted
+        if name == 'HGET':
+            if not self._alive(args[0]):
+                return None
+            return self.data[args[0]].get(args[1])
+        if name == 'HSET':
+            if not self._alive(args[0]):
+                self.data[args[0]] = {}
+            fields = self.data[args[0]]
+            added = 0
+            for field, value in zip(args[1::2], args[2::2]):
+                added += field not in fields
+                fields[field] = value
+            return added
+        if name == 'EXPIRE':
+            if not self._alive(args[0]):
+                return 0
+            self.expires[args[0]] = time.monotonic() + int(args[1])
+            return 1
+        if name == 'FLUSHALL':
+            self.data.clear()
+            self.expires.clear()
+            return b'OK'
+        if name == 'DBSIZE':
+            return sum(self._alive(key) for key in list(self.data))
+        raise ValueError(f"unknown command '{name}'")
+
+
+def encode(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, Exception):
+        return b'-ERR %s\r\n' % str(value).encode()
+    if value in (b'OK', b'PONG'):
+        return b'+%s\r\n' % value
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+async def read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    count = int(line[1:-2])
+    args = []
+    for _ in range(count):
+        size = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+async def serve(host='127.0.0.1', port=6390, redis=None):
+    redis = redis or FakeRedis()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                try:
+                    reply = redis.run(args[0].decode(), *args[1:])
+                except Exception as e:
+                    reply = e
+                writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def main(args):
+    server = await serve(args.host, args.port)
+    print(f'fake redis listening on {args.host}:{args.port}')
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,320 @@
+"""
+End-to-end load suite over every route of routers/snippets.py,
+routers/users.py and routers/data.py.
+
+Drives a running API one scenario at a time, for --duration seconds at
+--concurrency, and reports the throughput, the p50/p90/p99 latency, the
+errors and the SQL statements per request (read from the X-DB-Queries
+header, so start the server with APP_DEBUG=true). The targets are
+sampled from the same database the server uses, seeded by
+benchmarks.seed, and the tokens are signed with the secrets of .env, so
+both have to match the server's. Results are saved as JSON, --compare
+prints the change against an earlier run.
+
+Writes go to snippets the suite created itself, the seeded rows are only
+read. POST /users/auth/google-login is left out as it calls Google, the
+review scenario runs with --review against benchmarks.mock_llm.
+
+    DB_CONNECTION=sqlite DB_NAME=/tmp/load.db APP_DEBUG=true uvicorn main:app --port 8181
+    DB_CONNECTION=sqlite DB_NAME=/tmp/load.db python -m benchmarks.load \
+        --url http://127.0.0.1:8181 --duration 10 --concurrency 16 \
+        --output load.json --compare previous.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from datetime import datetime
+
+import httpx
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from database import connection_string
+from models.Snippet import Snippet
+from models.Tag import Tag, snippet_tags
+from models.User import User
+from utils import Auth
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0
+
+
+def sample_targets(samples, seed):
+    # uids, owners and passcodes of random rows, the busiest tags
+    rng = random.Random(seed)
+    engine = create_engine(connection_string)
+    with Session(engine) as session:
+        low, high = session.execute(select(func.min(Snippet.id), func.max(Snippet.id))).one()
+        if low is None:
+            raise SystemExit('the database holds no snippets, run benchmarks.seed first')
+        ids = [rng.randint(low, high) for _ in range(samples)]
+        rows = session.execute(
+            select(Snippet.uid, Snippet.visibility, Snippet.pass_code, Snippet.user_id)
+            .where(Snippet.id.in_(ids))
+        ).all()
+        owners = {
+            user.id: user
+            for user in session.scalars(select(User).where(User.id.in_({row.user_id for row in rows})))
+        }
+        tags = session.scalars(
+            select(Tag.name)
+            .join(snippet_tags, snippet_tags.c.tag_id == Tag.id)
+            .group_by(Tag.name)
+            .order_by(func.count().desc())
+            .limit(20)
+        ).all()
+
+    public = [row for row in rows if row.visibility == 1]
+    private = [row for row in rows if row.visibility == 2]
+    users = list(owners.values())
+    return {
+        'public': [row.uid for row in public],
+        'private': [(row.uid, row.pass_code) for row in private],
+        'owned': [(row.uid, access_headers(owners[row.user_id])) for row in rows],
+        'users': [access_headers(user) for user in users],
+        'refresh': [Auth.create_refresh_token(data={'sub': user.email}) for user in users],
+        'tags': tags or ['python'],
+        'terms': ['handler', 'query value', 'stream', 'cache key'],
+    }
+
+
+def access_headers(user):
+    return {'Authorization': f'Bearer {Auth.create_access_token(data=Auth.user_claims(user))}'}
+
+
+def scenarios(targets, review):
+    """
+    name -> async setup(client) returning request(client, rng) factories,
+    in the order they run: stores come before the updates and deletes of
+    the snippets they created.
+    """
+    created = []
+    owner = targets['users'][0]
+
+    def pick(rng, key):
+        return rng.choice(targets[key])
+
+    async def fetch(client, method, url, **kwargs):
+        return await client.request(method, f'/api/v1{url}', **kwargs)
+
+    async def conditional_feed(client):
+        response = await fetch(client, 'GET', '/snippets?limit=10')
+        etag = response.headers.get('ETag')
+        return lambda c, rng: fetch(c, 'GET', '/snippets?limit=10', headers={'If-None-Match': etag})
+
+    async def deep_feed(client):
+        # a cursor a few pages in, like a reader scrolling the feed
+        cursor = None
+        for _ in range(5):
+            body = (await fetch(client, 'GET', '/snippets?limit=10' + (f'&cursor={cursor}' if cursor else ''))).json()
+            cursor = body['data'].get('next_cursor') or cursor
+        return lambda c, rng: fetch(c, 'GET', f'/snippets?limit=10&cursor={cursor}')
+
+    async def conditional_show(client):
+        etags = {}
+        for uid in targets['public'][:50]:
+            response = await fetch(client, 'GET', f'/snippets/{uid}')
+            etags[uid] = response.headers.get('ETag')
+
+        def request(c, rng):
+            uid = rng.choice(list(etags))
+            return fetch(c, 'GET', f'/snippets/{uid}', headers={'If-None-Match': etags[uid]})
+        return request
+
+    def show_private(c, rng):
+        uid, pass_code = pick(rng, 'private')
+        return fetch(c, 'POST', f'/snippets/private/{uid}', json={'pass_code': pass_code})
+
+    def edit(c, rng):
+        uid, headers = pick(rng, 'owned')
+        return fetch(c, 'GET', f'/snippets/{uid}/edit', headers=headers)
+
+    def store(c, rng):
+        async def run():
+            response = await fetch(c, 'POST', '/snippets', headers=owner, json={
+                'title': f'load {rng.randrange(1 << 30)}',
+                'source_code': 'def handler(event):\n    return event\n' * rng.randint(1, 40),
+                'language': 'py',
+                'tags': ['load', rng.choice(targets['tags'])],
+                'visibility': 1,
+                'theme': 'monokai',
+            })
+            if response.status_code < 300:
+                created.append(response.json()['data']['snippet']['uid'])
+            return response
+        return run()
+
+    def update(c, rng):
+        if not created:
+            return None
+        return fetch(c, 'PUT', f'/snippets/{rng.choice(created)}', headers=owner, json={
+            'title': f'load update {rng.randrange(1 << 30)}',
+        })
+
+    def destroy(c, rng):
+        # workers stop once every created snippet is gone
+        if not created:
+            return None
+        return fetch(c, 'DELETE', f'/snippets/{created.pop()}', headers=owner)
+
+    async def review_stream(c, rng):
+        async with c.stream('POST', '/api/v1/snippets/code/review', json={
+            'source_code': f'print({rng.randrange(1 << 30)})', 'language': 'py'
+        }) as response:
+            async for _ in response.aiter_bytes():
+                pass
+        return response
+
+    def static(request):
+        async def setup(client):
+            return request
+        return setup
+
+    suite = {
+        'data.languages': static(lambda c, rng: fetch(c, 'GET', '/data/languages')),
+        'data.themes': static(lambda c, rng: fetch(c, 'GET', '/data/themes')),
+        'snippets.index': static(lambda c, rng: fetch(c, 'GET', '/snippets?limit=10')),
+        'snippets.index_304': conditional_feed,
+        'snippets.index_cursor': deep_feed,
+        'snippets.index_search': static(lambda c, rng: fetch(c, 'GET', f"/snippets?limit=10&q={pick(rng, 'terms')}")),
+        'snippets.index_tag': static(lambda c, rng: fetch(c, 'GET', f"/snippets?limit=10&tag={pick(rng, 'tags')}")),
+        'snippets.my': static(lambda c, rng: fetch(c, 'GET', '/snippets/my?limit=10', headers=pick(rng, 'users'))),
+        'snippets.tags': static(lambda c, rng: fetch(c, 'GET', '/snippets/tags')),
+        'snippets.show': static(lambda c, rng: fetch(c, 'GET', f"/snippets/{pick(rng, 'public')}")),
+        'snippets.show_304': conditional_show,
+        'snippets.show_private': static(show_private),
+        'snippets.edit': static(edit),
+        'snippets.store': static(store),
+        'snippets.update': static(update),
+        'snippets.destroy': static(destroy),
+        'users.refreshtoken': static(lambda c, rng: fetch(
+            c, 'POST', '/users/auth/refreshtoken', cookies={'refresh_token': pick(rng, 'refresh')}
+        )),
+        'users.logout': static(lambda c, rng: fetch(c, 'POST', '/users/auth/logout')),
+    }
+    if not targets['private']:
+        del suite['snippets.show_private']
+    if review:
+        suite['snippets.review'] = static(review_stream)
+    return suite
+
+
+async def worker(client, request, rng, deadline, stats):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            pending = request(client, rng)
+            if pending is None:
+                return
+            response = await pending
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                stats['errors'][str(response.status_code)] = stats['errors'].get(str(response.status_code), 0) + 1
+            queries = response.headers.get('X-DB-Queries')
+            if queries is not None:
+                stats['queries'].append(int(queries))
+        except httpx.HTTPError as e:
+            elapsed = time.perf_counter() - started
+            stats['errors'][type(e).__name__] = stats['errors'].get(type(e).__name__, 0) + 1
+        stats['latencies'].append(elapsed)
+
+
+async def run_scenario(client, setup, concurrency, duration, seed):
+    request = await setup(client)
+    stats = {'latencies': [], 'errors': {}, 'queries': []}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*[
+        worker(client, request, random.Random(seed + i), deadline, stats)
+        for i in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(stats['latencies'])
+    queries = stats['queries']
+    return {
+        'requests': len(latencies),
+        'errors': stats['errors'],
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p90_ms': percentile(latencies, 0.9) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'queries_mean': sum(queries) / len(queries) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(name, result, previous):
+    errors = sum(result['errors'].values())
+    queries = f"{result['queries_mean']:.1f}/{result['queries_max']}" if result['queries_mean'] is not None else '-'
+    line = (
+        f"{name:<24} {result['requests']:>7} {errors:>5} {result['rps']:>8.1f} "
+        f"{result['p50_ms']:>8.1f} {result['p90_ms']:>8.1f} {result['p99_ms']:>8.1f} {queries:>9}"
+    )
+    if previous and previous.get('rps'):
+        line += f"   rps {result['rps'] / previous['rps'] - 1:+.0%} p99 {result['p99_ms'] / previous['p99_ms'] - 1:+.0%}"
+    print(line)
+
+
+async def main(args):
+    targets = sample_targets(args.samples, args.seed)
+    suite = scenarios(targets, args.review)
+    if args.only:
+        suite = {name: setup for name, setup in suite.items() if any(part in name for part in args.only.split(','))}
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)['results']
+
+    report = {
+        'started_at': datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'label': args.label,
+        'url': args.url,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'seed': args.seed,
+        'results': {},
+    }
+
+    print(f"{'scenario':<24} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'queries':>9}")
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        for name, setup in suite.items():
+            result = await run_scenario(client, setup, args.concurrency, args.duration, args.seed)
+            report['results'][name] = result
+            print_result(name, result, previous.get(name))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f'saved to {args.output}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8181')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--samples', type=int, default=2000, help='random snippets to draw the targets from')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', help='comma separated parts of the scenario names to run')
+    parser.add_argument('--review', action='store_true', help='also stream code reviews')
+    parser.add_argument('--label', help='free text saved with the results')
+    parser.add_argument('--output', help='file to save the results to as JSON')
+    parser.add_argument('--compare', help='results of an earlier run to compare with')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""
+Local stand-in for the chat completions API, streaming made-up reviews
+the way OpenAI does ('data:' chunks with a delta, then 'data: [DONE]'),
+so the review path can be measured without calling the model.
+
+The first token comes after --latency ms, the next ones at --rate tokens
+per second, both spread by up to --jitter percent. --fail-rate answers a
+share of the requests with a 500, --drop-rate cuts a share of the streams
+halfway. /stats counts the requests by outcome.
+
+    python -m benchmarks.mock_llm --port 8765 --rate 50 --tokens 300
+    OPENAI_API_BASE=http://127.0.0.1:8765/v1 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+words = (
+    'def', 'return', 'self', 'value', 'the', 'handler', 'should', 'check',
+    'None', 'before', 'calling', 'it', 'and', '#', 'loop', 'over', 'items',
+)
+
+
+def chunk(model, content=None, finish_reason=None):
+    delta = {'content': content} if content is not None else {}
+    body = {
+        'id': 'chatcmpl-mock',
+        'object': 'chat.completion.chunk',
+        'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    }
+    return f'data: {json.dumps(body)}\n\n'
+
+
+def create_app(options):
+    stats = {'requests': 0, 'streaming': 0, 'completed': 0, 'failed': 0, 'dropped': 0, 'aborted': 0}
+    jitter = options.jitter / 100
+
+    def spread(seconds):
+        return max(0, seconds * (1 + random.uniform(-jitter, jitter)))
+
+    async def completions(request):
+        body = await request.json()
+        model = body.get('model', 'mock')
+        stats['requests'] += 1
+
+        if random.random() < options.fail_rate:
+            stats['failed'] += 1
+            return JSONResponse({'error': {'message': 'injected failure'}}, status_code=500)
+        if not body.get('stream'):
+            return JSONResponse({'error': {'message': 'only streaming is mocked'}}, status_code=400)
+
+        drop_at = options.tokens // 2 if random.random() < options.drop_rate else None
+
+        async def stream():
+            stats['streaming'] += 1
+            try:
+                await asyncio.sleep(spread(options.latency / 1000))
+                yield chunk(model, '')
+                for i in range(options.tokens):
+                    if i == drop_at:
+                        stats['dropped'] += 1
+                        return
+                    if i:
+                        await asyncio.sleep(spread(1 / options.rate))
+                    yield chunk(model, ('\n' if i % 12 == 11 else ' ') + random.choice(words))
+                yield chunk(model, finish_reason='stop')
+                yield 'data: [DONE]\n\n'
+                stats['completed'] += 1
+            except asyncio.CancelledError:
+                stats['aborted'] += 1
+                raise
+            finally:
+                stats['streaming'] -= 1
+
+        return StreamingResponse(stream(), media_type='text/event-stream')
+
+    async def get_stats(request):
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route('/v1/chat/completions', completions, methods=['POST']),
+        Route('/stats', get_stats),
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tokens', type=int, default=300, help='tokens per review')
+    parser.add_argument('--rate', type=float, default=50, help='tokens per second')
+    parser.add_argument('--latency', type=float, default=500, help='ms to the first token')
+    parser.add_argument('--jitter', type=float, default=20, help='percent of spread on every delay')
+    parser.add_argument('--fail-rate', type=float, default=0, help='share of requests answered with a 500')
+    parser.add_argument('--drop-rate', type=float, default=0, help='share of streams cut halfway')
+    args = parser.parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level='warning')
@@ -0,0 +1,104 @@
+"""
+Deep page latency of offset pagination against keyset (cursor) pagination.
+
+Seeds the configured database (DB_* settings in .env) up to --rows public
+snippets if it holds fewer, then times fetching the page that starts at
+each --depths offset with both strategies. Use a scratch database, e.g.
+DB_CONNECTION=sqlite DB_NAME=/tmp/bench.db.
+
+    python -m benchmarks.pagination --rows 1000000 --depths 0,1000,100000,900000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from database import Base, connection_string
+from models.Snippet import Snippet
+from models.User import User
+from utils import Cursor
+
+keyset = (Snippet.created_at, Snippet.id)
+
+
+def seed(session, rows, batch=10000):
+    user_id = session.scalar(select(User.id).limit(1))
+    if user_id is None:
+        user = User(name='Bench', username='bench', email='bench@example.com')
+        session.add(user)
+        session.commit()
+        user_id = user.id
+
+    existing = session.scalar(select(func.count(Snippet.id)))
+    # a few snippets per second, like a busy feed
+    started_at = datetime(2023, 1, 1)
+    for start in range(existing, rows, batch):
+        session.execute(
+            insert(Snippet),
+            [
+                {
+                    'uid': f'bench{i}',
+                    'title': f'snippet {i}',
+                    **Snippet.source_columns('print("hello world")\n' * 10),
+                    'language': 'py',
+                    'visibility': 1,
+                    'user_id': user_id,
+                    'created_at': started_at + timedelta(seconds=i // 3),
+                }
+                for i in range(start, min(start + batch, rows))
+            ]
+        )
+        session.commit()
+        print(f'seeded {min(start + batch, rows)}/{rows}', end='\r')
+    print()
+
+
+def timed(session, query, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = session.execute(query).all()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return rows, best * 1000
+
+
+def main(args):
+    engine = create_engine(connection_string)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        seed(session, args.rows)
+        base = select(Snippet.id, Snippet.uid, Snippet.created_at).where(Snippet.visibility == 1)
+
+        print(f"{'depth':>9} {'offset ms':>10} {'keyset ms':>10}")
+        for depth in [int(depth) for depth in args.depths.split(',')]:
+            page = depth // args.limit + 1
+            offset_rows, offset_ms = timed(
+                session, Cursor.paginate(base, keyset, None, page, args.limit), args.repeat
+            )
+
+            # the cursor a client would hold after reading up to this depth
+            cursor = None
+            if depth:
+                previous = session.execute(
+                    Cursor.paginate(base, keyset, None, page - 1, args.limit)
+                ).all()
+                cursor = Cursor.encode(*[getattr(previous[args.limit - 1], c.key) for c in keyset])
+            keyset_rows, keyset_ms = timed(
+                session, Cursor.paginate(base, keyset, cursor, 1, args.limit), args.repeat
+            )
+
+            assert [r.id for r in offset_rows] == [r.id for r in keyset_rows]
+            print(f'{depth:>9} {offset_ms:>10.2f} {keyset_ms:>10.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--depths', default='0,1000,10000,100000,500000,900000')
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    main(parser.parse_args())
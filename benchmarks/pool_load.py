@@ -0,0 +1,91 @@
+"""
+Load test for the pooled, request-scoped database sessions.
+
+Drives a running API at increasing concurrency levels and reports the
+throughput of each level together with the peak pool occupancy sampled
+from /api/v1/stats/pool, so it is visible whether throughput keeps scaling
+until the pool (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW) is saturated.
+
+    python -m benchmarks.pool_load --url http://127.0.0.1:8181 \
+        --path /api/v1/snippets --levels 1,2,4,8,16,32 --duration 10
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def worker(client, path, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - started)
+
+
+async def sample_pool(client, deadline, peak):
+    while time.perf_counter() < deadline:
+        try:
+            response = await client.get('/api/v1/stats/pool')
+            pool = response.json()['data']['pool']
+            peak['checked_out'] = max(peak['checked_out'], pool['checked_out'])
+            peak['capacity'] = pool['capacity']
+        except (httpx.HTTPError, KeyError, ValueError):
+            pass
+        await asyncio.sleep(0.1)
+
+
+async def run_level(url, path, concurrency, duration):
+    latencies = []
+    errors = []
+    peak = {'checked_out': 0, 'capacity': None}
+    limits = httpx.Limits(max_connections=concurrency + 1)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            sample_pool(client, deadline, peak),
+            *[
+                worker(client, path, deadline, latencies, errors)
+                for _ in range(concurrency)
+            ]
+        )
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'concurrency': concurrency,
+        'requests': count,
+        'errors': len(errors),
+        'rps': count / duration,
+        'p50_ms': latencies[count // 2] * 1000 if count else 0,
+        'p99_ms': latencies[min(count - 1, int(count * 0.99))] * 1000 if count else 0,
+        'peak_checked_out': peak['checked_out'],
+        'pool_capacity': peak['capacity'],
+    }
+
+
+async def main(args):
+    levels = [int(level) for level in args.levels.split(',')]
+    print(f"{'conc':>5} {'reqs':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p99 ms':>9} {'pool':>9}")
+    for concurrency in levels:
+        result = await run_level(args.url, args.path, concurrency, args.duration)
+        print(
+            f"{result['concurrency']:>5} {result['requests']:>7} {result['errors']:>5} "
+            f"{result['rps']:>9.1f} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+            f"{result['peak_checked_out']:>4}/{result['pool_capacity']}"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8181')
+    parser.add_argument('--path', default='/api/v1/snippets')
+    parser.add_argument('--levels', default='1,2,4,8,16,32')
+    parser.add_argument('--duration', type=float, default=10)
+    asyncio.run(main(parser.parse_args()))
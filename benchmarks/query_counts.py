@@ -0,0 +1,179 @@
+"""
+Number of SQL statements run by every snippet endpoint, checked against a
+budget of the statements it needs so that regressions fail the run (exit
+status 1). Listings and the bulk store are measured with 1 row and with a
+full page as well: a count growing with the rows is an N+1 whatever the
+budget says.
+
+Runs in process against a throwaway sqlite database unless DB_* settings
+are given in the environment.
+
+    python -m benchmarks.query_counts
+"""
+import os
+import sys
+import tempfile
+
+os.environ.setdefault('DB_CONNECTION', 'sqlite')
+os.environ.setdefault('DB_NAME', os.path.join(tempfile.mkdtemp(), 'query_counts.db'))
+os.environ['APP_DEBUG'] = 'true'
+os.environ['RESPONSE_CACHE'] = 'off'
+for key, value in {
+    'ACCESS_TOKEN_SECRET': 'query-counts',
+    'ALGORITHM': 'HS256',
+    'ACCESS_TOKEN_EXPIRE_MINUTES': '15',
+}.items():
+    os.environ.setdefault(key, value)
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from database import Base, connection_string  # noqa: E402
+from main import app  # noqa: E402
+from models.User import User  # noqa: E402
+from utils import Auth  # noqa: E402
+
+# statements each endpoint needs, authentication reads the user from the
+# token. Writes are measured adding one new tag and one existing tag
+budgets = {
+    # tags lookup, the snippet, the new tag, the links, the refresh of the
+    # server defaults and the owner of the response
+    'store': 6,
+    # tags lookup, the missing tags in one insert and their ids, the
+    # snippets, their ids and the links
+    'bulk_store': 6,
+    # the page and its total
+    'index': 2,
+    # the versions of the page and its total, the ETag covers both
+    'index_304': 2,
+    'index_search': 2,
+    'index_tag': 2,
+    # the page, the feed of a user has no total
+    'my': 1,
+    'tags': 1,
+    'show': 1,
+    'show_304': 1,
+    'show_private': 1,
+    # the headers only, the body is read once they are sent
+    'raw': 1,
+    'raw_head': 1,
+    'edit': 1,
+    # the ownership check of the validator, the snippet again with its
+    # tags in the session of the route, the row, the tags lookup, the new
+    # tag, and the links removed and added
+    'update': 8,
+    # the ownership check, the links and the row
+    'destroy': 3,
+}
+
+# listings measured at 1 row and at page_size rows
+page_size = 10
+pages = {
+    'index': ('/snippets?limit={}', False),
+    'index_search': ('/snippets?limit={}&q=print', False),
+    'index_tag': ('/snippets?limit={}&tag=python', False),
+    'my': ('/snippets/my?limit={}', True),
+}
+
+def main():
+    engine = create_engine(connection_string)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        owner = User(name='Query Counts', username='querycounts', email='query@counts.dev')
+        session.add(owner)
+        session.commit()
+        token = Auth.create_access_token(data=Auth.user_claims(owner))
+
+    headers = {'Authorization': f'Bearer {token}'}
+    client = TestClient(app)
+    counts = {}
+
+    def request(name, method, url, **kwargs):
+        response = client.request(method, f'/api/v1{url}', **kwargs)
+        assert response.status_code < 400, (name, response.status_code, response.text)
+        return response
+
+    def measure(name, method, url, **kwargs):
+        response = request(name, method, url, **kwargs)
+        counts[name] = int(response.headers['X-DB-Queries'])
+        return response
+
+    def bulk(size, prefix):
+        return {'snippets': [
+            {
+                'title': f'{prefix} {i}',
+                'source_code': f'print({i})',
+                'language': 'py',
+                'tags': ['python', f'{prefix}{i}'],
+                'visibility': 1,
+                'theme': 'monokai',
+            }
+            for i in range(size)
+        ]}
+
+    uids = []
+    for i in range(12):
+        response = measure('store', 'POST', '/snippets', headers=headers, json={
+            'title': f'snippet {i}',
+            'source_code': f'print({i})',
+            'language': 'py',
+            'tags': ['python', f'tag{i}'],
+            'visibility': 2 if i == 0 else 1,
+            'pass_code': 'abc123',
+            'theme': 'monokai',
+        })
+        uids.append(response.json()['data']['snippet']['uid'])
+
+    measure('bulk_store', 'POST', '/snippets/bulk', headers=headers, json=bulk(20, 'bulk'))
+
+    response = measure('index', 'GET', '/snippets?limit=10')
+    measure('index_304', 'GET', '/snippets?limit=10', headers={'If-None-Match': response.headers['ETag']})
+    measure('index_search', 'GET', '/snippets?limit=10&q=print')
+    measure('index_tag', 'GET', '/snippets?limit=10&tag=python')
+    measure('my', 'GET', '/snippets/my?limit=10', headers=headers)
+    measure('tags', 'GET', '/snippets/tags')
+    response = measure('show', 'GET', f'/snippets/{uids[1]}')
+    measure('show_304', 'GET', f'/snippets/{uids[1]}', headers={'If-None-Match': response.headers['ETag']})
+    measure('show_private', 'POST', f'/snippets/private/{uids[0]}', json={'pass_code': 'abc123'})
+    measure('raw', 'GET', f'/snippets/{uids[1]}/raw', headers={'Range': 'bytes=0-3'})
+    measure('raw_head', 'HEAD', f'/snippets/{uids[1]}/raw')
+    measure('edit', 'GET', f'/snippets/{uids[1]}/edit', headers=headers)
+    measure('update', 'PUT', f'/snippets/{uids[1]}', headers=headers, json={'tags': ['go']})
+    measure('destroy', 'DELETE', f'/snippets/{uids[1]}', headers=headers)
+
+    # (statements for 1 row, for page_size rows)
+    scaling = {
+        'bulk_store': tuple(
+            int(request(
+                'bulk_store', 'POST', '/snippets/bulk', headers=headers, json=bulk(size, f'rows{size}-')
+            ).headers['X-DB-Queries'])
+            for size in (1, page_size)
+        ),
+    }
+    for name, (url, private) in pages.items():
+        measured = []
+        for size in (1, page_size):
+            response = request(name, 'GET', url.format(size), headers=headers if private else None)
+            assert len(response.json()['data']['snippets']) == size, (name, size)
+            measured.append(int(response.headers['X-DB-Queries']))
+        scaling[name] = tuple(measured)
+
+    failed = False
+    print(f"{'endpoint':<14} {'queries':>7} {'budget':>6}")
+    for name, budget in budgets.items():
+        status = '' if counts[name] <= budget else '  over budget'
+        failed = failed or bool(status)
+        print(f'{name:<14} {counts[name]:>7} {budget:>6}{status}')
+
+    print(f"\n{'endpoint':<14} {'1 row':>7} {f'{page_size} rows':>8}")
+    for name, (one, full) in scaling.items():
+        status = '' if one == full else '  grows with the rows'
+        failed = failed or bool(status)
+        print(f'{name:<14} {one:>7} {full:>8}{status}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Latency of GET /snippets/{uid} and of the first feed page with the
+response cache off, in process memory and behind the redis protocol (a
+local benchmarks.fake_redis server), with the SQL statements per request
+and the cache counters of each run.
+
+Runs in process against a throwaway sqlite database unless DB_* settings
+are given in the environment.
+
+    python -m benchmarks.response_cache --snippets 1000 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+os.environ.setdefault('DB_CONNECTION', 'sqlite')
+os.environ.setdefault('DB_NAME', os.path.join(tempfile.mkdtemp(), 'response_cache.db'))
+os.environ['APP_DEBUG'] = 'true'
+os.environ.setdefault('REDIS_URL', 'redis://127.0.0.1:6390/0')
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from benchmarks import fake_redis  # noqa: E402
+from database import Base, connection_string  # noqa: E402
+from main import app  # noqa: E402
+from models.Snippet import Snippet  # noqa: E402
+from models.User import User  # noqa: E402
+from services import cache_service  # noqa: E402
+
+
+def seed(count):
+    engine = create_engine(connection_string)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        user = User(name='Response Cache', username='responsecache', email='cache@bench.dev')
+        session.add(user)
+        session.flush()
+        source_code = 'def handler(event):\n    return event\n' * 40
+        session.execute(insert(Snippet), [
+            {
+                'uid': f'cache{i}',
+                'title': f'snippet {i}',
+                **Snippet.source_columns(source_code),
+                'language': 'py',
+                'visibility': 1,
+                'theme': 'monokai',
+                'user_id': user.id,
+            }
+            for i in range(count)
+        ])
+        session.commit()
+    return [f'cache{i}' for i in range(count)]
+
+
+def start_fake_redis():
+    loop = asyncio.new_event_loop()
+    port = urlparse(cache_service.redis_url).port
+    server = loop.run_until_complete(fake_redis.serve(port=port))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return server
+
+
+def run(client, name, urls):
+    queries = 0
+    started = time.perf_counter()
+    for url in urls:
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+        queries += int(response.headers.get('X-DB-Queries', 0))
+    elapsed = time.perf_counter() - started
+
+    stats = cache_service.stats()
+    print(
+        f'{name:<16} {elapsed / len(urls) * 1e6:>10.1f} '
+        f'{queries / len(urls):>8.2f} {stats["hits"]:>6} {stats["misses"]:>6} '
+        f'{stats["evictions"]:>9}'
+    )
+
+
+def main(args):
+    uids = seed(args.snippets)
+    start_fake_redis()
+
+    # a few hot snippets take most of the traffic, like shared links do
+    rng = random.Random(42)
+    hot = uids[:max(1, len(uids) // 100)]
+    show_urls = [
+        f'/api/v1/snippets/{rng.choice(hot) if rng.random() < 0.9 else rng.choice(uids)}'
+        for _ in range(args.requests)
+    ]
+    feed_urls = ['/api/v1/snippets?limit=10'] * args.requests
+
+    print(f"{'run':<16} {'us/request':>10} {'queries':>8} {'hits':>6} {'misses':>6} {'evictions':>9}")
+    with TestClient(app) as client:
+        for backend in ('off', 'memory', 'redis'):
+            for name, urls in (('show', show_urls), ('feed', feed_urls)):
+                cache_service.configure(backend)
+                cache_service.counters.update(dict.fromkeys(cache_service.counters, 0))
+                run(client, f'{name} {backend}', urls)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--snippets', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=2000)
+    main(parser.parse_args())
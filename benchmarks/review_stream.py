@@ -0,0 +1,143 @@
+"""
+Streaming benchmark of the code review endpoint.
+
+Opens N concurrent review streams against a running API per level and
+reports the time to the first byte and to the first token, the tokens
+per second across the streams, the p50/p99 stream duration, and the
+peak resident memory of the server process (--pid, read from /proc).
+Every stream reviews distinct code unless --same is given, which
+measures the coalesced path instead.
+
+Run it against the local model stand-in, with the review cache off and
+the admission limits above the tested level:
+
+    python -m benchmarks.mock_llm --port 8765 --rate 50 --tokens 300
+    OPENAI_API_BASE=http://127.0.0.1:8765/v1 REVIEW_CACHE=false \
+        REVIEW_BURST=100000 REVIEW_CONCURRENCY=1000 uvicorn main:app --port 8181
+    python -m benchmarks.review_stream --url http://127.0.0.1:8181 \
+        --levels 1,10,50,200 --pid $(pgrep -f 'uvicorn main:app')
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0
+
+
+def rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+async def sample_memory(pid, done, peak):
+    while not done.is_set():
+        rss = rss_kb(pid)
+        if rss is not None:
+            peak['rss_kb'] = max(peak['rss_kb'], rss)
+        await asyncio.sleep(0.05)
+
+
+async def review(client, source_code):
+    result = {'status': None, 'ttfb': None, 'first_token': None, 'tokens': 0, 'error': None}
+    started = time.perf_counter()
+    try:
+        async with client.stream(
+            'POST',
+            '/api/v1/snippets/code/review',
+            json={'source_code': source_code, 'language': 'py'},
+        ) as response:
+            result['status'] = response.status_code
+            result['ttfb'] = time.perf_counter() - started
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith('event:'):
+                    event = line[6:].strip()
+                elif line.startswith('data:'):
+                    if event == 'error':
+                        result['error'] = json.loads(line[5:])['detail']
+                    elif event is None:
+                        if result['first_token'] is None:
+                            result['first_token'] = time.perf_counter() - started
+                        result['tokens'] += 1
+                elif not line:
+                    event = None
+    except httpx.HTTPError as e:
+        result['error'] = str(e) or type(e).__name__
+    result['duration'] = time.perf_counter() - started
+    return result
+
+
+async def run_level(url, streams, same, pid):
+    peak = {'rss_kb': 0}
+    done = asyncio.Event()
+    rss_before = rss_kb(pid) if pid else None
+    limits = httpx.Limits(max_connections=streams)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=300) as client:
+        sampler = asyncio.create_task(sample_memory(pid, done, peak)) if pid else None
+        started = time.perf_counter()
+        results = await asyncio.gather(*[
+            review(client, 'print("same")' if same else f'print("{uuid.uuid4().hex}")')
+            for _ in range(streams)
+        ])
+        elapsed = time.perf_counter() - started
+        done.set()
+        if sampler:
+            await sampler
+
+    ok = [r for r in results if r['status'] == 200 and not r['error']]
+    tokens = sum(r['tokens'] for r in results)
+    return {
+        'streams': streams,
+        'ok': len(ok),
+        'failed': streams - len(ok),
+        'ttfb_p50_ms': percentile([r['ttfb'] for r in ok], 0.5) * 1000,
+        'first_token_p50_ms': percentile([r['first_token'] for r in ok], 0.5) * 1000,
+        'tokens_per_s': tokens / elapsed,
+        'duration_p50_s': percentile([r['duration'] for r in ok], 0.5),
+        'duration_p99_s': percentile([r['duration'] for r in ok], 0.99),
+        'rss_before_mb': rss_before / 1024 if rss_before else None,
+        'rss_peak_mb': peak['rss_kb'] / 1024 if pid else None,
+    }
+
+
+async def main(args):
+    levels = [int(level) for level in args.levels.split(',')]
+    print(
+        f"{'streams':>7} {'ok':>6} {'fail':>5} {'ttfb ms':>8} {'1st tok ms':>10} "
+        f"{'tok/s':>9} {'p50 s':>7} {'p99 s':>7} {'rss MB':>13}"
+    )
+    for streams in levels:
+        result = await run_level(args.url, streams, args.same, args.pid)
+        memory = (
+            f"{result['rss_before_mb']:.0f}->{result['rss_peak_mb']:.0f}"
+            if args.pid and result['rss_before_mb'] else '-'
+        )
+        print(
+            f"{result['streams']:>7} {result['ok']:>6} {result['failed']:>5} "
+            f"{result['ttfb_p50_ms']:>8.1f} {result['first_token_p50_ms']:>10.1f} "
+            f"{result['tokens_per_s']:>9.0f} {result['duration_p50_s']:>7.2f} "
+            f"{result['duration_p99_s']:>7.2f} {memory:>13}"
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8181')
+    parser.add_argument('--levels', default='1,10,50')
+    parser.add_argument('--same', action='store_true', help='identical code in every stream')
+    parser.add_argument('--pid', type=int, help='server process to sample the memory of')
+    asyncio.run(main(parser.parse_args()))
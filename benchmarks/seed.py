@@ -0,0 +1,211 @@
+"""
+Seeded synthetic dataset for the load suite: users, tags and snippets
+with realistic shapes. Snippets cover every language of the catalog
+(common ones more often), source sizes follow a log-normal distribution
+around a kilobyte, a few users own most snippets, tags are zipf-like and
+one in ten snippets is private. A share of the snippets (--copies) reuses
+verbatim a source of a shared pool, the popular ones more often, like the
+forks, re-shares and pasted boilerplate of a real library.
+
+The same --seed gives the same rows. A run tops the configured database
+(DB_* settings in .env) up to the requested counts, so an interrupted run
+resumes where it stopped. Use a scratch database.
+
+    DB_CONNECTION=sqlite DB_NAME=/tmp/load.db \
+        python -m benchmarks.seed --users 100000 --snippets 5000000
+"""
+import argparse
+import math
+import random
+import string
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import Session
+
+from database import Base, connection_string
+from lib.catalog import languages_by_ext, themes_by_value
+from models.Snippet import Snippet
+from models.Tag import Tag, snippet_tags
+from models.User import User
+
+# relative share of the common languages, every other one weighs 1
+popularity = {
+    'js': 30, 'py': 30, 'ts': 20, 'java': 15, 'html': 12, 'css': 12,
+    'cpp': 10, 'cs': 10, 'php': 10, 'sql': 10, 'go': 8, 'sh': 8,
+    'json': 8, 'jsx': 6, 'tsx': 6, 'rs': 5, 'rb': 5, 'kt': 4,
+    'swift': 4, 'c': 4, 'yaml': 4, 'md': 3, 'dart': 3, 'vue': 3,
+}
+
+words = (
+    'async', 'await', 'buffer', 'cache', 'client', 'config', 'count', 'data',
+    'error', 'event', 'fetch', 'filter', 'handler', 'index', 'items', 'key',
+    'list', 'loop', 'map', 'merge', 'node', 'parse', 'query', 'queue',
+    'request', 'result', 'route', 'server', 'sort', 'state', 'stream',
+    'token', 'tree', 'user', 'value', 'worker',
+)
+
+tag_names = (
+    'python', 'javascript', 'typescript', 'react', 'django', 'fastapi',
+    'flask', 'node', 'express', 'sql', 'postgres', 'mysql', 'sqlite',
+    'redis', 'docker', 'kubernetes', 'aws', 'linux', 'bash', 'git', 'go',
+    'rust', 'java', 'spring', 'kotlin', 'android', 'ios', 'swift', 'css',
+    'html', 'vue', 'angular', 'graphql', 'rest', 'testing', 'async',
+    'algorithms', 'regex', 'security', 'performance',
+) + tuple(f'topic{i}' for i in range(460))
+
+# a snippet every 12 seconds or so, 5M of them span about two years
+started_at = datetime(2022, 1, 1)
+interval = 12
+
+
+def make_corpus(rng, size=1 << 18):
+    # code-like text the sources are cut from
+    lines = []
+    length = 0
+    while length < size:
+        indent = '    ' * rng.randint(0, 3)
+        line = f'{indent}{rng.choice(words)}_{rng.choice(words)} = {rng.choice(words)}({rng.choice(words)}, {rng.randint(0, 999)})'
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)
+
+
+def make_pool(rng, corpus, size=300):
+    # the sources the copies are taken from
+    pool = []
+    for _ in range(size):
+        length = min(len(corpus) - 1, max(20, int(rng.lognormvariate(math.log(900), 1.0))))
+        offset = rng.randrange(len(corpus) - length)
+        pool.append(corpus[offset:offset + length])
+    return pool, cumulative(1 / (rank + 1) for rank in range(size))
+
+
+def seed_users(session, users, batch):
+    existing = session.scalar(select(func.count(User.id)))
+    for start in range(existing, users, batch):
+        session.execute(
+            insert(User),
+            [
+                {
+                    'name': f'Seed User {i}',
+                    'username': f'seed{i}',
+                    'email': f'seed{i}@seed.dev',
+                    'google_auth': 1,
+                }
+                for i in range(start, min(start + batch, users))
+            ]
+        )
+        session.commit()
+        print(f'users {min(start + batch, users)}/{users}', end='\r')
+    print()
+    return [row for row, in session.execute(select(User.id).order_by(User.id))]
+
+
+def seed_tags(session):
+    existing = set(session.scalars(select(Tag.name).where(Tag.name.in_(tag_names))))
+    missing = [name for name in tag_names if name not in existing]
+    if missing:
+        session.execute(insert(Tag), [{'name': name} for name in missing])
+        session.commit()
+    return dict(session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(tag_names))).all())
+
+
+def make_snippet(rng, i, corpus, user_ids, languages, language_weights, themes, tag_weights,
+                 pool=None, copies=0):
+    size = min(len(corpus) - 1, max(20, int(rng.lognormvariate(math.log(900), 1.0))))
+    offset = rng.randrange(len(corpus) - size)
+    source_code = corpus[offset:offset + size]
+    # no draw without copies, the rows of a seed stay the same as before
+    if copies and rng.random() < copies:
+        sources, weights = pool
+        source_code = rng.choices(sources, cum_weights=weights)[0]
+    tags = sorted(set(rng.choices(tag_names, cum_weights=tag_weights, k=rng.choice((0, 1, 2, 2, 3, 3, 4, 5)))))
+    private = rng.random() < 0.1
+    return {
+        'uid': f'seed-{i}',
+        'title': ' '.join(rng.choices(words, k=rng.randint(2, 5)))[:50],
+        'language': rng.choices(languages, cum_weights=language_weights)[0],
+        'tags': ','.join(tags) or None,
+        'visibility': 2 if private else 1,
+        'pass_code': ''.join(rng.choices(string.ascii_lowercase + string.digits, k=6)) if private else None,
+        'theme': rng.choice(themes),
+        # the cube skews ownership, a few users write most snippets
+        'user_id': user_ids[int(len(user_ids) * rng.random() ** 3)],
+        'created_at': started_at + timedelta(seconds=(i + rng.random()) * interval),
+        **Snippet.source_columns(source_code),
+    }, tags
+
+
+def cumulative(weights):
+    total = 0
+    result = []
+    for weight in weights:
+        total += weight
+        result.append(total)
+    return result
+
+
+def seed_snippets(session, snippets, seed, batch, user_ids, tag_ids, copies):
+    corpus = make_corpus(random.Random(seed))
+    pool = make_pool(random.Random(f'{seed}:pool'), corpus)
+    languages = list(languages_by_ext)
+    language_weights = cumulative(popularity.get(ext, 1) for ext in languages)
+    themes = list(themes_by_value)
+    tag_weights = cumulative(1 / (rank + 1) for rank in range(len(tag_names)))
+
+    existing = session.scalar(select(func.count(Snippet.id)).where(Snippet.uid.like('seed-%')))
+    started = time.perf_counter()
+    # batches start at multiples of batch, each with a generator of its own,
+    # so resuming gives the same rows as an uninterrupted run
+    for start in range(existing - existing % batch, snippets, batch):
+        rng = random.Random(f'{seed}:{start}')
+        rows = [
+            make_snippet(
+                rng, i, corpus, user_ids, languages, language_weights, themes, tag_weights,
+                pool, copies
+            )
+            for i in range(start, min(start + batch, snippets))
+        ]
+        rows = rows[existing - start:] if existing > start else rows
+        session.execute(insert(Snippet), [row for row, _ in rows])
+
+        ids = dict(session.execute(
+            select(Snippet.uid, Snippet.id).where(Snippet.uid.in_([row['uid'] for row, _ in rows]))
+        ).all())
+        links = [
+            {'snippet_id': ids[row['uid']], 'tag_id': tag_ids[name]}
+            for row, tags in rows
+            for name in tags
+        ]
+        if links:
+            session.execute(insert(snippet_tags), links)
+        session.commit()
+
+        done = min(start + batch, snippets)
+        rate = (done - existing) / (time.perf_counter() - started)
+        print(f'snippets {done}/{snippets} ({rate:.0f}/s)', end='\r')
+    print()
+
+
+def main(args):
+    engine = create_engine(connection_string)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        user_ids = seed_users(session, args.users, args.batch)
+        tag_ids = seed_tags(session)
+        seed_snippets(
+            session, args.snippets, args.seed, args.batch, user_ids, tag_ids, args.copies
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--snippets', type=int, default=5000000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch', type=int, default=10000)
+    parser.add_argument('--copies', type=float, default=0.1, help='share of snippets copying a pooled source')
+    main(parser.parse_args())
@@ -0,0 +1,125 @@
+"""
+Cost of turning 1,000 loaded snippets into a response body per view:
+before, serialize() trimmed with del and encoded by the stdlib json of
+JSONResponse, after, the view projection encoded by ORJSONResponse.
+
+Needs no database, the snippets are built in memory.
+
+    python -m benchmarks.serialization --snippets 1000 --rounds 50
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DB_CONNECTION', 'sqlite')
+os.environ.setdefault('DB_NAME', os.path.join(tempfile.mkdtemp(), 'serialization.db'))
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+
+from lib.catalog import get_language  # noqa: E402
+from models.Snippet import Snippet  # noqa: E402
+from models.User import User  # noqa: E402
+
+
+def make_snippets(count):
+    owner = User(id=1, name='Serialization', username='serialization', email='s@bench.dev')
+    started = datetime(2024, 1, 1)
+    snippets = []
+    for i in range(count):
+        snippet = Snippet(
+            id=i + 1,
+            uid=f'bench{i}',
+            title=f'snippet {i}',
+            source_code='def handler(event):\n    return event\n' * 20,
+            language=('py', 'js', 'go', 'rs')[i % 4],
+            tags='python,async,web' if i % 2 else None,
+            visibility=2 if i % 10 == 0 else 1,
+            pass_code='abc123' if i % 10 == 0 else None,
+            theme='monokai',
+            user_id=owner.id,
+            created_at=started + timedelta(minutes=i),
+            updated_at=None,
+        )
+        snippet.user = owner
+        snippet.source_preview = snippet.preview
+        snippets.append(snippet)
+    return snippets
+
+
+# the handlers before the projections
+
+def feed_before(snippet):
+    _snippet = snippet.serialize(with_source_code=False)
+    del _snippet['id']
+    del _snippet['visibility']
+    del _snippet['updated_at']
+    _snippet['mode'] = get_language(_snippet['_lang'])['mode']
+    del _snippet['_lang']
+    _snippet['source_code'] = snippet.source_preview
+    return _snippet
+
+
+def detail_before(snippet):
+    _snippet = snippet.serialize()
+    del _snippet['id']
+    del _snippet['visibility']
+    del _snippet['updated_at']
+    _snippet['mode'] = get_language(_snippet['_lang'])['mode']
+    del _snippet['_lang']
+    return _snippet
+
+
+def edit_before(snippet):
+    _snippet = snippet.serialize()
+    del _snippet['id']
+    del _snippet['created_at']
+    del _snippet['updated_at']
+    del _snippet['owner']
+    _snippet['mode'] = get_language(_snippet['_lang'])['mode']
+    _snippet['language'] = _snippet['_lang']
+    del _snippet['_lang']
+    return _snippet
+
+
+def library_before(snippet):
+    _snippet = snippet.serialize(with_source_code=False)
+    if _snippet['visibility'] == 2:
+        del _snippet['pass_code']
+    del _snippet['theme']
+    return _snippet
+
+
+views = {
+    'feed item': (feed_before, Snippet.feed_item),
+    'detail': (detail_before, Snippet.detail),
+    'edit': (edit_before, Snippet.edit_view),
+    'my library item': (library_before, Snippet.library_item),
+}
+
+
+def measure(snippets, project, response_class, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        response_class(content={'data': {'snippets': [project(s) for s in snippets]}})
+    return (time.perf_counter() - started) / rounds * 1000 * 1000 / len(snippets)
+
+
+def main(args):
+    snippets = make_snippets(args.snippets)
+    print(f"{'view':<16} {'before ms':>10} {'after ms':>10} {'speedup':>8}   (per 1,000 snippets)")
+    for name, (before, after) in views.items():
+        # same response, the feed only ever holds public snippets
+        for snippet in snippets[:10] if name != 'feed item' else snippets[1:10]:
+            assert before(snippet) == after(snippet), name
+        old = measure(snippets, before, JSONResponse, args.rounds)
+        new = measure(snippets, after, ORJSONResponse, args.rounds)
+        print(f'{name:<16} {old:>10.2f} {new:>10.2f} {old / new:>7.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--snippets', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=50)
+    main(parser.parse_args())
@@ -0,0 +1,119 @@
+"""
+Size of the snippets table and latency of a snippet read with the stored
+sources plain, zlib and zstd compressed (zstd when the zstandard package
+is installed). Each codec gets a temporary sqlite database seeded with the
+same sources as benchmarks.seed, sized around a kilobyte, moved to blobs
+by migrations.source_compression, and reads load a snippet by uid and
+decode its source like the detail view. The table size counts the blobs
+and the searched words, the size of the search index is reported apart.
+
+    python -m benchmarks.source_compression --snippets 20000 --reads 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('DB_CONNECTION', 'sqlite')
+os.environ.setdefault('DB_NAME', os.path.join(tempfile.mkdtemp(), 'source_compression.db'))
+
+from sqlalchemy import create_engine, func, insert, select, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from benchmarks.seed import cumulative, make_corpus, make_snippet, tag_names  # noqa: E402
+from database import Base  # noqa: E402
+from lib.catalog import languages_by_ext, themes_by_value  # noqa: E402
+from migrations.source_compression import upgrade  # noqa: E402
+from models.Snippet import Snippet  # noqa: E402
+from models.SnippetBlob import SnippetBlob  # noqa: E402
+from models.User import User  # noqa: E402
+from utils import Codec  # noqa: E402
+
+
+def seed(engine, count, seed_value):
+    rng = random.Random(seed_value)
+    corpus = make_corpus(rng)
+    languages = list(languages_by_ext)
+    language_weights = cumulative(1 for _ in languages)
+    tag_weights = cumulative(1 / (rank + 1) for rank in range(len(tag_names)))
+    with Session(engine) as session:
+        user = User(name='Compression', username='compression', email='c@bench.dev')
+        session.add(user)
+        session.flush()
+        for start in range(0, count, 1000):
+            session.execute(insert(Snippet), [
+                make_snippet(
+                    rng, i, corpus, [user.id], languages, language_weights,
+                    list(themes_by_value), tag_weights
+                )[0]
+                for i in range(start, min(start + 1000, count))
+            ])
+        session.commit()
+
+
+def table_size(engine):
+    # pages of the table and its blobs, the search index is reported apart
+    with engine.connect() as connection:
+        # merges the index segments the moved sources were deleted from
+        connection.execute(text("INSERT INTO snippets_fts(snippets_fts) VALUES('optimize')"))
+        connection.commit()
+        connection.execute(text('VACUUM'))
+        sizes = dict(connection.execute(text(
+            "SELECT name, SUM(pgsize) FROM dbstat "
+            "WHERE name IN ('snippets', 'snippet_blobs', 'snippets_fts_data') GROUP BY name"
+        )).all())
+    return sizes.get('snippets', 0) + sizes.get('snippet_blobs', 0), sizes.get('snippets_fts_data', 0)
+
+
+def read(engine, uids):
+    timings = []
+    with Session(engine) as session:
+        for uid in uids:
+            started = time.perf_counter()
+            snippet = session.scalars(select(Snippet).where(Snippet.uid == uid)).one()
+            len(snippet.source_code)
+            timings.append(time.perf_counter() - started)
+            session.expunge(snippet)
+    return timings
+
+
+def main(args):
+    codecs = ['off', 'zlib'] + (['zstd'] if Codec.zstandard is not None else [])
+    rng = random.Random(args.seed)
+    uids = [f'seed-{rng.randrange(args.snippets)}' for _ in range(args.reads)]
+
+    print(f"{'codec':<6} {'compressed':>10} {'table MB':>9} {'index MB':>9} {'p50 ms':>7} {'p99 ms':>7}")
+    for name in codecs:
+        Codec.codec = Codec.formats_by_name.get(name)
+        path = os.path.join(tempfile.mkdtemp(), f'{name}.db')
+        engine = create_engine(f'sqlite:///{path}')
+        Base.metadata.create_all(engine)
+        seed(engine, args.snippets, args.seed)
+        upgrade(engine, batch_size=2000)
+
+        with engine.connect() as connection:
+            compressed = connection.scalar(
+                select(func.count())
+                .select_from(Snippet)
+                .join(SnippetBlob, SnippetBlob.hash == Snippet.blob_hash)
+                .where(func.substr(SnippetBlob.data, 1, 1) != Codec.plain.marker)
+            )
+        table, index = table_size(engine)
+        # one warm-up pass so every run reads from the page cache
+        read(engine, uids[:200])
+        timings = sorted(read(engine, uids))
+        print(
+            f'{name:<6} {compressed / args.snippets:>10.0%} {table / 1e6:>9.1f} {index / 1e6:>9.1f} '
+            f'{statistics.median(timings) * 1000:>7.3f} {timings[int(len(timings) * 0.99)] * 1000:>7.3f}'
+        )
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--snippets', type=int, default=20000)
+    parser.add_argument('--reads', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -1,9 +1,15 @@
+from contextlib import asynccontextmanager
+from functools import partial
 from os import environ
 
+import anyio
+import anyio.lowlevel
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import CursorResult, create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 
 load_dotenv()
 
@@ -13,13 +19,192 @@ db_port = environ.get('DB_PORT')
 db_name = environ.get('DB_NAME')
 db_user = environ.get('DB_USERNAME')
 db_password = environ.get('DB_PASSWORD')
-db_connector = 'mysql+mysqlconnector' if db_connection == 'mysql' else 'postgresql'
 
-connection_string = f"{db_connector}://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+# DB_ASYNC=true serves requests from an AsyncEngine, otherwise the sync
+# engine is used and every database call is pushed to the threadpool
+db_async = environ.get('DB_ASYNC', 'false').lower() == 'true'
 
-engine = create_engine(connection_string, echo=False)
+# (sync connector, async connector) per DB_CONNECTION
+db_connectors = {
+    'mysql': ('mysql+mysqlconnector', 'mysql+aiomysql'),
+    'pgsql': ('postgresql', 'postgresql+asyncpg'),
+    'sqlite': ('sqlite', 'sqlite+aiosqlite'),
+}
+db_connector, db_async_connector = db_connectors.get(
+    db_connection, db_connectors['pgsql']
+)
+# any other DB_CONNECTION connects to postgres, as above
+db_postgres = db_connection not in ('mysql', 'sqlite')
 
-Session = sessionmaker(bind=engine)
-db = Session()
+if db_connection == 'sqlite':
+    # local runs, DB_NAME is the path of the database file
+    connection_string = f"{db_connector}:///{db_name}"
+    async_connection_string = f"{db_async_connector}:///{db_name}"
+else:
+    connection_string = f"{db_connector}://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+    async_connection_string = f"{db_async_connector}://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+
+# connection pool tuning, one pooled connection is checked out per request
+pool_size = int(environ.get('DB_POOL_SIZE', 10))
+pool_max_overflow = int(environ.get('DB_POOL_MAX_OVERFLOW', 20))
+pool_timeout = int(environ.get('DB_POOL_TIMEOUT', 30))
+pool_recycle = int(environ.get('DB_POOL_RECYCLE', 1800))
+pool_pre_ping = environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+engine_options = {'echo': False, 'pool_pre_ping': pool_pre_ping}
+if db_connection != 'sqlite':
+    # the sqlite dialects pick their own pool class
+    engine_options.update(
+        pool_size=pool_size,
+        max_overflow=pool_max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+    )
+
+if db_async:
+    engine = create_async_engine(async_connection_string, **engine_options)
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+else:
+    engine = create_engine(connection_string, **engine_options)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
 
 Base = declarative_base()
+
+
+class SyncSessionAdapter:
+    """
+    Exposes a sync Session through the AsyncSession API, so the handlers
+    are written once and await the same calls in both modes. Each call
+    runs in the threadpool and results are buffered before returning.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        def execute():
+            result = self.sync_session.execute(statement, *args, **kwargs)
+            if isinstance(result, CursorResult) and not result.returns_rows:
+                return result
+            return result.freeze()
+
+        result = await run_in_threadpool(execute)
+        return result() if callable(result) else result
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        result = await self.execute(statement, *args, **kwargs)
+        return result.scalars()
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+
+async def get_db():
+    # one session per request, FastAPI caches the dependency so the
+    # validators, middlewares and the handler of a request share it
+    if db_async:
+        async with Session() as db:
+            yield db
+    else:
+        db = SyncSessionAdapter(Session())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+@asynccontextmanager
+async def open_session():
+    """
+    A session of its own, outside of the request dependencies: for short
+    lookups and for response bodies streamed after the dependencies are
+    done. A download stopped half way cancels the body, the close is
+    shielded so the connection is still handed back.
+    """
+    db = Session() if db_async else SyncSessionAdapter(Session())
+    try:
+        yield db
+    finally:
+        with anyio.CancelScope(shield=True):
+            await db.close()
+
+
+async def stream_partitions(db, statement, size):
+    """
+    Rows of a select in lists of up to size, fetched through a server-side
+    cursor where the driver has one, so a large result is never held in
+    memory at once. Takes the session of either mode.
+    """
+    statement = statement.execution_options(yield_per=size)
+    if db_async:
+        result = await db.stream(statement)
+        partitions = result.partitions()
+        fetch = partial(anext, partitions, None)
+        close = result.close
+    else:
+        result = await run_in_threadpool(db.sync_session.execute, statement)
+        partitions = result.partitions()
+        fetch = partial(run_in_threadpool, next, partitions, None)
+        close = partial(run_in_threadpool, result.close)
+
+    try:
+        while True:
+            # a cancelled response stops between two fetches, never in the
+            # middle of one with the cursor half read
+            await anyio.lowlevel.checkpoint()
+            with anyio.CancelScope(shield=True):
+                partition = await fetch()
+            if partition is None:
+                break
+            yield partition
+    finally:
+        with anyio.CancelScope(shield=True):
+            await close()
+
+
+def pool_stats():
+    pool = engine.pool
+    if not hasattr(pool, 'checkedout'):
+        return {'class': type(pool).__name__}
+
+    # the sqlite pools are not built from the DB_POOL_* settings
+    max_overflow = getattr(pool, '_max_overflow', pool_max_overflow)
+    return {
+        'class': type(pool).__name__,
+        'size': pool.size(),
+        'checked_in': pool.checkedin(),
+        'checked_out': pool.checkedout(),
+        'overflow': pool.overflow(),
+        'max_overflow': max_overflow,
+        'capacity': pool.size() + max_overflow,
+    }
@@ -0,0 +1,74 @@
+"""
+Read-only registry of the languages and themes in lib/data, built once at
+import. Lookups are dict hits instead of scans of the lists, and the
+/data responses are encoded up front together with their ETags.
+"""
+import hashlib
+import json
+from types import MappingProxyType
+
+from lib.data.languages import languages as _languages
+from lib.data.themes import themes as _themes
+
+
+def _freeze(items):
+    return tuple(MappingProxyType(dict(item)) for item in items)
+
+
+def _index(items, key):
+    # the first entry wins, like the linear scans this replaces
+    index = {}
+    for item in items:
+        index.setdefault(item[key], item)
+    return MappingProxyType(index)
+
+
+def _check_unique(items, key, kind):
+    seen = set()
+    for item in items:
+        if item[key] in seen:
+            raise ValueError(f'duplicate {kind} {key} {item[key]!r}')
+        seen.add(item[key])
+
+
+def _encode(key, items):
+    return json.dumps(
+        {'data': {key: [dict(item) for item in items]}},
+        separators=(',', ':')
+    ).encode()
+
+
+def _etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+# an ext or theme value stored twice would make the second entry
+# unreachable, fail at startup instead
+_check_unique(_languages, 'ext', 'language')
+_check_unique(_themes, 'value', 'theme')
+
+languages = _freeze(_languages)
+themes = _freeze(_themes)
+
+languages_by_ext = _index(languages, 'ext')
+themes_by_value = _index(themes, 'value')
+
+# several languages share an editor mode (c_cpp)
+languages_by_mode = MappingProxyType({
+    mode: tuple(lang for lang in languages if lang['mode'] == mode)
+    for mode in dict.fromkeys(lang['mode'] for lang in languages)
+})
+
+# bodies of GET /data/languages and GET /data/themes
+languages_json = _encode('languages', languages)
+themes_json = _encode('themes', themes)
+languages_etag = _etag(languages_json)
+themes_etag = _etag(themes_json)
+
+
+def get_language(ext):
+    return languages_by_ext.get(ext)
+
+
+def get_theme(value):
+    return themes_by_value.get(value)
@@ -1,13 +1,17 @@
-from fastapi import FastAPI
+from os import environ
+
+from fastapi import FastAPI, Request
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 # from database import Base, engine
-from routers import snippets, users, data
+from database import engine
+from routers import snippets, users, data, stats
+from utils import QueryCounter
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 # Base.metadata.create_all(engine)
 
 app.add_middleware(
@@ -19,6 +23,19 @@ app.add_middleware(
 )
 
 
+if environ.get('APP_DEBUG', 'false').lower() == 'true':
+    # report the number of SQL statements each request ran, see
+    # benchmarks/query_counts.py
+    QueryCounter.install(engine)
+
+    @app.middleware('http')
+    async def count_queries(request: Request, call_next):
+        counter = QueryCounter.start()
+        response = await call_next(request)
+        response.headers['X-DB-Queries'] = str(counter[0])
+        return response
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
     error_messages = {}
@@ -30,7 +47,7 @@ async def validation_exception_handler(request, exc):
             status_code = 415
             error_messages[error['loc'][0]] = error['msg']
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status_code,
         content=jsonable_encoder({'detail': error_messages}),
     )
@@ -43,3 +60,4 @@ async def root():
 app.include_router(snippets.router, prefix="/api/v1")
 app.include_router(users.router, prefix="/api/v1")
 app.include_router(data.router, prefix="/api/v1")
+app.include_router(stats.router, prefix="/api/v1")
@@ -6,7 +6,10 @@ from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
 
-from database import db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
 from models.User import User
 from utils import Auth
 import re
@@ -14,7 +17,7 @@ import re
 load_dotenv()
 
 
-async def get_current_user(request: Request):
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)):
     token_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail='Unauthorized',
@@ -28,6 +31,11 @@ async def get_current_user(request: Request):
     token = token.replace('Bearer ', '')
 
     try:
+        # tokens carrying fresh profile claims need no lookup
+        user = Auth.verify_access_token(token)
+        if user is not None:
+            return user
+
         payload = Auth.decode_access_token(token)
         email = payload.get('sub')
         if not email:
@@ -36,7 +44,7 @@ async def get_current_user(request: Request):
     except Exception as e:
         raise token_exception
 
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         raise token_exception
 
@@ -50,7 +58,7 @@ async def get_current_user(request: Request):
     return user
 
 
-async def get_current_user2(request: Request):
+async def get_current_user2(request: Request, db: AsyncSession = Depends(get_db)):
     token = request.headers.get('Authorization')
     
     if token is None or not token.startswith('Bearer '):
@@ -59,6 +67,10 @@ async def get_current_user2(request: Request):
     token = token.replace('Bearer ', '')
 
     try:
+        user = Auth.verify_access_token(token)
+        if user is not None:
+            return user
+
         payload = Auth.decode_access_token(token)
         email = payload.get('sub')
         if not email:
@@ -67,7 +79,7 @@ async def get_current_user2(request: Request):
     except Exception as e:
         return None
 
-    _user = db.query(User).filter(User.email == email).first()
+    _user = await db.scalar(select(User).where(User.email == email))
     if not _user:
         return None
 
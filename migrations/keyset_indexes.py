@@ -0,0 +1,28 @@
+"""
+Adds the composite indexes used by the keyset pagination of GET /snippets
+and GET /snippets/my to an existing database.
+
+    python -m migrations.keyset_indexes
+"""
+from sqlalchemy import create_engine
+
+from database import connection_string
+from models.Snippet import Snippet
+
+index_names = (
+    'ix_snippets_visibility_created_at_id',
+    'ix_snippets_user_id_created_at_id',
+)
+
+
+def upgrade(connection):
+    for index in Snippet.__table__.indexes:
+        if index.name in index_names:
+            index.create(connection, checkfirst=True)
+
+
+if __name__ == '__main__':
+    engine = create_engine(connection_string)
+    with engine.begin() as connection:
+        upgrade(connection)
+    print('keyset indexes created')
@@ -0,0 +1,20 @@
+"""
+Creates the reviews table backing the code review cache.
+
+    python -m migrations.reviews
+"""
+from sqlalchemy import create_engine
+
+from database import connection_string
+from models.Review import Review
+
+
+def upgrade(connection):
+    Review.__table__.create(connection, checkfirst=True)
+
+
+if __name__ == '__main__':
+    engine = create_engine(connection_string)
+    with engine.begin() as connection:
+        upgrade(connection)
+    print('reviews table created')
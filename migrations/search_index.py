@@ -0,0 +1,36 @@
+"""
+Creates the full-text search index over title, tags and source_code of
+existing snippets (generated tsvector column and GIN index on postgres,
+FULLTEXT index on mysql, FTS5 table and sync triggers on sqlite) and fills
+it from the rows already stored.
+
+    python -m migrations.search_index
+"""
+from sqlalchemy import create_engine, inspect, text
+
+from database import connection_string
+from models.Snippet import search_ddl
+
+
+def upgrade(connection):
+    dialect = connection.dialect.name
+
+    if dialect == 'mysql':
+        indexes = inspect(connection).get_indexes('snippets')
+        if any(index['name'] == 'ft_snippets_search' for index in indexes):
+            return
+
+    for statement in search_ddl[dialect]:
+        connection.execute(text(statement))
+
+    if dialect == 'sqlite':
+        # external content FTS5 tables are filled by the triggers from now
+        # on, rebuild indexes the rows written before them
+        connection.execute(text("INSERT INTO snippets_fts (snippets_fts) VALUES ('rebuild')"))
+
+
+if __name__ == '__main__':
+    engine = create_engine(connection_string)
+    with engine.begin() as connection:
+        upgrade(connection)
+    print('search index created')
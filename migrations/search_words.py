@@ -0,0 +1,88 @@
+"""
+Adds the search_text column to snippets, the words of each source the
+full-text index reads, fills it for the rows already stored and builds the
+search index over it instead of source_code, which holds '' for sources
+stored in a blob. Safe to run again.
+
+    python -m migrations.search_words
+"""
+from sqlalchemy import bindparam, create_engine, inspect, select, text, update
+
+from database import connection_string
+from models.Snippet import Snippet, search_ddl, search_words
+
+batch_size = 500
+
+drop_ddl = {
+    'postgresql': [
+        'DROP INDEX IF EXISTS ix_snippets_search_vector',
+        'ALTER TABLE snippets DROP COLUMN IF EXISTS search_vector',
+    ],
+    'mysql': [],
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS snippets_fts_insert',
+        'DROP TRIGGER IF EXISTS snippets_fts_delete',
+        'DROP TRIGGER IF EXISTS snippets_fts_update',
+        'DROP TABLE IF EXISTS snippets_fts',
+    ],
+}
+
+
+def upgrade(connection):
+    dialect = connection.dialect.name
+
+    # the index is dropped first, the triggers would index every backfilled
+    # row once more
+    statements = list(drop_ddl[dialect])
+    if dialect == 'mysql':
+        indexes = inspect(connection).get_indexes('snippets')
+        if any(index['name'] == 'ft_snippets_search' for index in indexes):
+            statements.append('DROP INDEX ft_snippets_search ON snippets')
+    for statement in statements:
+        connection.execute(text(statement))
+
+    existing = {column['name'] for column in inspect(connection).get_columns('snippets')}
+    if 'search_text' not in existing:
+        column_type = Snippet.__table__.c.search_text.type.compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE snippets ADD COLUMN search_text {column_type}'))
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(Snippet.id, Snippet.source_code, Snippet.source_data.label('source_data'))
+            .where(Snippet.id > last_id, Snippet.search_text.is_(None))
+            .order_by(Snippet.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        connection.execute(
+            update(Snippet.__table__)
+            .where(Snippet.__table__.c.id == bindparam('row_id'))
+            .values(
+                search_text=bindparam('words'),
+                # same source, the snippet was not edited
+                updated_at=Snippet.__table__.c.updated_at,
+            ),
+            [
+                {
+                    'row_id': row.id,
+                    'words': search_words(Snippet.read_source(row.source_code, row.source_data)),
+                }
+                for row in rows
+            ]
+        )
+        last_id = rows[-1].id
+
+    for statement in search_ddl[dialect]:
+        connection.execute(text(statement))
+    if dialect == 'sqlite':
+        connection.execute(text("INSERT INTO snippets_fts (snippets_fts) VALUES ('rebuild')"))
+
+
+if __name__ == '__main__':
+    engine = create_engine(connection_string)
+    with engine.begin() as connection:
+        upgrade(connection)
+    print('search words backfilled and indexed')
@@ -0,0 +1,73 @@
+"""
+Creates the snippet_blobs table and the blob_hash column of snippets.
+Sources compressed into the former snippets.source_data column are moved
+to blobs, in batches, before the column is dropped. Safe to run again.
+
+    python -m migrations.snippet_blobs
+
+Sources stored inline are moved to blobs by migrations.source_compression.
+"""
+from sqlalchemy import (MetaData, Table, bindparam, create_engine, inspect,
+                        select, text, update)
+
+from database import connection_string
+from models.Snippet import Snippet
+from models.SnippetBlob import SnippetBlob
+from services import blob_service
+from utils import Codec
+
+batch_size = 500
+
+
+def upgrade(connection):
+    SnippetBlob.__table__.create(connection, checkfirst=True)
+
+    existing = {column['name'] for column in inspect(connection).get_columns('snippets')}
+    if 'blob_hash' not in existing:
+        column_type = Snippet.__table__.c.blob_hash.type.compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE snippets ADD COLUMN blob_hash {column_type}'))
+        connection.execute(text('CREATE INDEX ix_snippets_blob_hash ON snippets (blob_hash)'))
+
+    if 'source_data' not in existing:
+        return
+
+    snippets = Table('snippets', MetaData(), autoload_with=connection)
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(snippets.c.id, snippets.c.source_data)
+            .where(snippets.c.id > last_id, snippets.c.source_data.isnot(None))
+            .order_by(snippets.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        blobs = []
+        for row in rows:
+            source_code = Codec.decompress(row.source_data)
+            blobs.append({
+                'row_id': row.id,
+                'hash': blob_service.get_hash(source_code),
+                'data': row.source_data,
+                'byte_count': len(source_code.encode()),
+            })
+        connection.execute(blob_service.upsert(blob_service.count_references(
+            [{key: blob[key] for key in ('hash', 'data', 'byte_count')} for blob in blobs]
+        )))
+        connection.execute(
+            update(snippets)
+            .where(snippets.c.id == bindparam('row_id'))
+            .values(blob_hash=bindparam('hash'), source_data=None),
+            [{'row_id': blob['row_id'], 'hash': blob['hash']} for blob in blobs]
+        )
+        last_id = rows[-1].id
+
+    connection.execute(text('ALTER TABLE snippets DROP COLUMN source_data'))
+
+
+if __name__ == '__main__':
+    engine = create_engine(connection_string)
+    with engine.begin() as connection:
+        upgrade(connection)
+    print('snippet blobs created')
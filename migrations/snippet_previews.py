@@ -0,0 +1,60 @@
+"""
+Adds the preview, line_count and byte_count columns to snippets and fills
+them for the rows already stored, in batches. Until a row is filled the
+feed cuts its preview on the database side.
+
+    python -m migrations.snippet_previews
+"""
+from sqlalchemy import bindparam, create_engine, inspect, select, text, update
+
+from database import connection_string
+from models.Snippet import PREVIEW_LENGTH, Snippet
+
+batch_size = 500
+columns = ('preview', 'line_count', 'byte_count')
+
+
+def upgrade(connection):
+    existing = {column['name'] for column in inspect(connection).get_columns('snippets')}
+    for name in columns:
+        if name not in existing:
+            column_type = Snippet.__table__.c[name].type.compile(dialect=connection.dialect)
+            connection.execute(text(f'ALTER TABLE snippets ADD COLUMN {name} {column_type}'))
+
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(Snippet.id, Snippet.source_code)
+            .where(Snippet.id > last_id, Snippet.byte_count.is_(None))
+            .order_by(Snippet.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        connection.execute(
+            update(Snippet.__table__)
+            .where(Snippet.__table__.c.id == bindparam('row_id'))
+            .values(
+                preview=bindparam('preview'),
+                line_count=bindparam('line_count'),
+                byte_count=bindparam('byte_count'),
+            ),
+            [
+                {
+                    'row_id': row.id,
+                    'preview': row.source_code[:PREVIEW_LENGTH],
+                    'line_count': row.source_code.count('\n') + 1,
+                    'byte_count': len(row.source_code.encode()),
+                }
+                for row in rows
+            ]
+        )
+        last_id = rows[-1].id
+
+
+if __name__ == '__main__':
+    engine = create_engine(connection_string)
+    with engine.begin() as connection:
+        upgrade(connection)
+    print('snippet previews backfilled')
@@ -0,0 +1,59 @@
+"""
+Creates the tags and snippet_tags tables and backfills them from the comma
+joined snippets.tags column of the rows already stored. Safe to run again,
+snippets that already have tag rows are skipped.
+
+    python -m migrations.snippet_tags
+"""
+from sqlalchemy import create_engine, insert, select
+
+from database import connection_string
+from models.Snippet import Snippet
+from models.Tag import Tag, snippet_tags
+from utils.helpers import clean_tags
+
+batch_size = 1000
+
+
+def upgrade(connection):
+    Tag.__table__.create(connection, checkfirst=True)
+    snippet_tags.create(connection, checkfirst=True)
+
+    tag_ids = dict(connection.execute(select(Tag.name, Tag.id)).all())
+    tagged = select(snippet_tags.c.snippet_id)
+    last_id = 0
+
+    while True:
+        rows = connection.execute(
+            select(Snippet.id, Snippet.tags)
+            .where(
+                Snippet.id > last_id,
+                Snippet.tags.isnot(None),
+                Snippet.id.notin_(tagged)
+            )
+            .order_by(Snippet.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        links = []
+        for row in rows:
+            for name in clean_tags(row.tags.split(',')):
+                name = name[:50]
+                if name not in tag_ids:
+                    tag_ids[name] = connection.execute(
+                        insert(Tag).values(name=name)
+                    ).inserted_primary_key[0]
+                links.append({'snippet_id': row.id, 'tag_id': tag_ids[name]})
+
+        if links:
+            connection.execute(insert(snippet_tags), links)
+        last_id = rows[-1].id
+
+
+if __name__ == '__main__':
+    engine = create_engine(connection_string)
+    with engine.begin() as connection:
+        upgrade(connection)
+    print('tags backfilled')
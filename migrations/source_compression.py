@@ -0,0 +1,162 @@
+"""
+Rewrites the sources already stored to match SNIPPETS_BLOB_MIN and
+SNIPPETS_COMPRESSION, in small batches of their own transaction so it can
+run next to a serving API. Long enough sources move to shared blobs,
+shorter ones back inline, and blobs written with another codec are
+encoded again, plain with SNIPPETS_COMPRESSION=off. Rows already stored
+right are left alone, running it again resumes. Needs
+migrations.snippet_blobs run first.
+
+    SNIPPETS_COMPRESSION=zstd python -m migrations.source_compression --pause 0.05
+
+The blobs no snippet points to anymore are deleted at the end.
+"""
+import argparse
+import time
+
+from sqlalchemy import bindparam, create_engine, func, select, update
+
+from database import connection_string
+from models.Snippet import Snippet
+from models.SnippetBlob import SnippetBlob
+from services import blob_service
+from utils import Codec
+
+
+def move_sources(connection, last_id, batch_size):
+    """
+    Stores the sources of the next batch after last_id the way the routes
+    would write them now. Returns the last id seen, None when done, and
+    the number of snippets rewritten.
+
+    The batch is locked until its transaction ends, an edit committed
+    between the read and the update would be overwritten with the old
+    source and its old blob released twice. Edits of these rows wait for
+    the batch instead. sqlite has no row locks, its write transactions
+    are serialized anyway.
+    """
+    rows = connection.execute(
+        select(
+            Snippet.id, Snippet.source_code, Snippet.source_data.label('source_data'),
+            Snippet.blob_hash, Snippet.byte_count,
+            Snippet.search_text.is_(None).label('unsearched')
+        )
+        .where(Snippet.id > last_id)
+        .order_by(Snippet.id)
+        .limit(batch_size)
+        .with_for_update(of=Snippet.__table__)
+    ).all()
+    if not rows:
+        return None, 0
+
+    changes = []
+    blobs = []
+    released = []
+    for row in rows:
+        source_code = Snippet.read_source(row.source_code, row.source_data)
+        columns, blob = blob_service.get_columns(source_code)
+        # rows from before the preview and search columns get them on the way
+        if columns['blob_hash'] == row.blob_hash and row.byte_count is not None \
+                and not row.unsearched:
+            continue
+        changes.append({'row_id': row.id, **columns})
+        if blob is not None:
+            blobs.append(blob)
+        if row.blob_hash is not None:
+            released.append(row.blob_hash)
+
+    if blobs:
+        connection.execute(blob_service.upsert(blob_service.count_references(blobs)))
+    if changes:
+        connection.execute(
+            update(Snippet.__table__)
+            .where(Snippet.__table__.c.id == bindparam('row_id'))
+            .values(
+                source_code=bindparam('source_text'),
+                blob_hash=bindparam('blob_hash'),
+                preview=bindparam('preview'),
+                line_count=bindparam('line_count'),
+                byte_count=bindparam('byte_count'),
+                search_text=bindparam('search_text'),
+                # same source, the snippet was not edited
+                updated_at=Snippet.__table__.c.updated_at,
+            ),
+            changes
+        )
+    if released:
+        connection.execute(
+            update(SnippetBlob)
+            .where(SnippetBlob.hash == bindparam('released'))
+            .values(ref_count=SnippetBlob.ref_count - 1),
+            [{'released': blob_hash} for blob_hash in released]
+        )
+    return rows[-1].id, len(changes)
+
+
+def recompress_blobs(connection, last_hash, batch_size):
+    # blobs still referenced but written with another codec, a blob the
+    # codec does not make smaller stays plain
+    rows = connection.execute(
+        select(SnippetBlob.hash, SnippetBlob.data)
+        .where(SnippetBlob.hash > last_hash, SnippetBlob.ref_count > 0)
+        .order_by(SnippetBlob.hash)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return None, 0
+
+    changes = []
+    for row in rows:
+        data = Codec.encode(Codec.decompress(row.data))
+        if data[:1] != row.data[:1]:
+            changes.append({'blob': row.hash, 'data': data})
+    if changes:
+        connection.execute(
+            update(SnippetBlob)
+            .where(SnippetBlob.hash == bindparam('blob'))
+            .values(data=bindparam('data')),
+            changes
+        )
+    return rows[-1].hash, len(changes)
+
+
+def run_batches(engine, step, start, batch_size, pause):
+    last, total = start, 0
+    while True:
+        with engine.begin() as connection:
+            last, count = step(connection, last, batch_size)
+        if last is None:
+            return total
+        total += count
+        print(f'{step.__name__} up to {last}', end='\r')
+        # leave room to the requests served meanwhile
+        time.sleep(pause)
+
+
+def upgrade(engine, batch_size=500, pause=0):
+    moved = run_batches(engine, move_sources, 0, batch_size, pause)
+    recompressed = run_batches(engine, recompress_blobs, '', batch_size, pause)
+    print()
+
+    with engine.begin() as connection:
+        deleted = blob_service.collect(connection)
+        blobs, size = connection.execute(
+            select(func.count(SnippetBlob.hash), func.sum(func.length(SnippetBlob.data)))
+        ).one()
+    return moved, recompressed, deleted, blobs, size or 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0, help='seconds between two batches')
+    args = parser.parse_args()
+
+    moved, recompressed, deleted, blobs, size = upgrade(
+        create_engine(connection_string), args.batch, args.pause
+    )
+    print(
+        f'sources stored with {Codec.codec_name}: {moved} snippets rewritten, '
+        f'{recompressed} blobs encoded again, {deleted} orphan blobs deleted, '
+        f'{blobs} blobs of {size / 1e6:.1f} MB left'
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy import TIMESTAMP, Column, Index, Integer, String, Text
+
+from database import Base
+
+
+class Review(Base):
+    """
+    Completed code reviews by content hash, see
+    services/review_cache_service.py.
+    """
+    __tablename__ = 'reviews'
+    __table_args__ = (
+        # eviction walks the least recently used reviews first
+        Index('ix_reviews_last_used_at', 'last_used_at'),
+    )
+    key = Column(String(64), primary_key=True)
+    model = Column(String(50), nullable=False)
+    language = Column(String(10), nullable=False)
+    content = Column(Text, nullable=False)
+    byte_count = Column(Integer, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(TIMESTAMP, nullable=False)
+    last_used_at = Column(TIMESTAMP, nullable=False)
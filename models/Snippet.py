@@ -1,49 +1,156 @@
-from sqlalchemy import (TIMESTAMP, Column, Enum, ForeignKey, Integer,
-                        SmallInteger, String, Text, func)
-from sqlalchemy.orm import relationship
+import re
 
-from database import Base, db
+from sqlalchemy import (DDL, TIMESTAMP, Column, Enum, Float, ForeignKey,
+                        Index, Integer, MetaData, SmallInteger, String, Table,
+                        Text, event, func, select)
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.orm import (column_property, deferred, query_expression,
+                            relationship, synonym)
+
+from database import Base
+from models.SnippetBlob import SnippetBlob
+from models.Tag import snippet_tags
 from models.User import User
-from lib.data.languages import languages
+from lib.catalog import get_language
+from utils import Codec
+
+
+# characters of source code shown by the feed
+PREVIEW_LENGTH = 200
+
+# characters of the searched words of a source, what postgres indexed of
+# source_code before, a tsvector is capped at 1MB
+SEARCH_LENGTH = 100000
+
 
+def search_words(source_code):
+    # the distinct words of a source in order, split like the query terms
+    # (see services/search_service.py) so every database matches the same
+    words = dict.fromkeys(re.findall(r'[^\W_]+', source_code.lower()))
+    return ' '.join(words)[:SEARCH_LENGTH]
 
-def get_language(ext):
-    for lang in languages:
-        if lang['ext'] == ext:
-            return lang
-    return None
+
+# sqlite keeps CURRENT_TIMESTAMP without microseconds, binding cursor values
+# in the same format keeps the keyset comparisons exact
+timestamp = TIMESTAMP().with_variant(
+    sqlite.DATETIME(
+        storage_format='%(year)04d-%(month)02d-%(day)02d '
+        '%(hour)02d:%(minute)02d:%(second)02d'
+    ),
+    'sqlite'
+)
 
 
 class Snippet(Base):
     __tablename__ = 'snippets'
+    __table_args__ = (
+        # keyset pagination of the public feed and of a user's library
+        Index('ix_snippets_visibility_created_at_id', 'visibility', 'created_at', 'id'),
+        Index('ix_snippets_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        # the blob collector looks up the snippets still pointing to a blob
+        Index('ix_snippets_blob_hash', 'blob_hash'),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     uid = Column(String(50), unique=True, nullable=False)
     title = Column(String(50), nullable=False)
-    source_code = Column(Text, nullable=False)
+    # the source as stored, plain text or '' when it is kept in a shared
+    # blob (see services/blob_service.py), read it as source_code
+    source_text = Column('source_code', Text, nullable=False)
+    blob_hash = Column(String(64), ForeignKey('snippet_blobs.hash'), nullable=True)
+    # loaded with the row, the listings defer it. blob_service sets it
+    # along with blob_hash, a flush does not have to load it again
+    source_data = column_property(
+        select(SnippetBlob.data)
+        .where(SnippetBlob.hash == blob_hash)
+        .scalar_subquery(),
+        expire_on_flush=False
+    )
     language = Column(String(10), nullable=False)
     tags = Column(String(255), nullable=True)
     visibility = Column(SmallInteger, nullable=False)
     pass_code = Column(String(6), nullable=True)
     theme = Column(String(25), nullable=False, server_default='monokai')
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    created_at = Column(timestamp, nullable=False, server_default=func.now())
     updated_at = Column(
-        TIMESTAMP,
+        timestamp,
         nullable=True,
         default=None,
         onupdate=func.now(),
         server_onupdate=func.now()
     )
-    deleted_at = Column(TIMESTAMP, nullable=True)
+    deleted_at = Column(timestamp, nullable=True)
+    # filled from source_code on write, so listings never have to load it
+    preview = Column(String(PREVIEW_LENGTH), nullable=True)
+    line_count = Column(Integer, nullable=True)
+    byte_count = Column(Integer, nullable=True)
+    # what the full-text index reads of the source, filled on write since
+    # sources stored in a blob hold '' in source_code. Never loaded
+    search_text = deferred(Column(Text, nullable=True))
+
+    # set by listing queries, see preview_expression()
+    source_preview = query_expression()
+
+    # owners are always eager loaded with the query, never one by one
+    user = relationship('User', back_populates='snippets', lazy='raise')
+    # normalized copy of tags for exact filtering and counts, the tags
+    # column keeps the comma joined names for display and full-text search
+    tag_list = relationship(
+        'Tag',
+        secondary=snippet_tags,
+        passive_deletes=True
+    )
+
+    def _get_source_code(self):
+        # decoded on access, the listings never load the source columns
+        if self.blob_hash is None:
+            return self.source_text
+        return Codec.decompress(self.source_data)
+
+    def _set_source_code(self, source_code):
+        # stores the source inline, the routes go through blob_service to
+        # share it in a blob and keep the references counted
+        for column, value in Snippet.source_columns(source_code).items():
+            setattr(self, column, value)
+
+    # queries see the stored column, rows with a blob hold '' in it
+    source_code = synonym(
+        'source_text',
+        descriptor=property(_get_source_code, _set_source_code)
+    )
 
-    user = relationship('User', back_populates='snippets')
+    @staticmethod
+    def source_columns(source_code):
+        # columns written from source_code stored inline, core inserts have
+        # to set them
+        return {
+            'source_text': source_code,
+            'blob_hash': None,
+            'preview': source_code[:PREVIEW_LENGTH],
+            'line_count': source_code.count('\n') + 1,
+            'byte_count': len(source_code.encode()),
+            'search_text': search_words(source_code),
+        }
+
+    @staticmethod
+    def read_source(source_text, source_data):
+        # the source of a row selected with both stored columns
+        return source_text if source_data is None else Codec.decompress(source_data)
+
+    @staticmethod
+    def preview_expression():
+        # rows written before the preview column existed get it cut by
+        # the database, source_code still never reaches the application
+        return func.coalesce(
+            Snippet.preview,
+            func.substr(Snippet.source_code, 1, PREVIEW_LENGTH)
+        )
 
-    def serialize(self):
+    def serialize(self, with_source_code=True):
         _snippet = {
             'id': self.id,
             'uid': self.uid,
             'title': self.title,
-            'source_code': self.source_code,
             '_lang': self.language,
             'language': get_language(self.language)['name'],
             'visibility': self.visibility,
@@ -52,12 +159,160 @@ class Snippet(Base):
 
         }
 
+        if with_source_code:
+            _snippet['source_code'] = self.source_code
+
+        if self.tags:
+            _snippet['tags'] = self.tags.split(',')
+
+        if self.visibility == 2:
+            _snippet['pass_code'] = self.pass_code
+
+        _snippet['created_at'] = str(self.created_at)
+        _snippet['updated_at'] = str(self.updated_at)
+        return _snippet
+
+    # projections of the responses, each builds only the fields its view
+    # sends instead of trimming serialize()
+
+    def feed_item(self):
+        # GET /snippets, source_preview must be loaded with the query
+        language = get_language(self.language)
+        _snippet = {
+            'uid': self.uid,
+            'title': self.title,
+            'language': language['name'],
+            'theme': self.theme,
+            'owner': self.user.name,
+        }
+        if self.tags:
+            _snippet['tags'] = self.tags.split(',')
+        _snippet['created_at'] = str(self.created_at)
+        _snippet['mode'] = language['mode']
+        _snippet['source_code'] = self.source_preview
+        return _snippet
+
+    def detail(self):
+        # GET /snippets/{uid} and POST /snippets/private/{uid}
+        language = get_language(self.language)
+        _snippet = {
+            'uid': self.uid,
+            'title': self.title,
+            'language': language['name'],
+            'theme': self.theme,
+            'owner': self.user.name,
+            'source_code': self.source_code,
+        }
         if self.tags:
             _snippet['tags'] = self.tags.split(',')
+        if self.visibility == 2:
+            _snippet['pass_code'] = self.pass_code
+        _snippet['created_at'] = str(self.created_at)
+        _snippet['mode'] = language['mode']
+        return _snippet
 
+    def edit_view(self):
+        # GET /snippets/{uid}/edit, language is the ext the form posts back
+        _snippet = {
+            'uid': self.uid,
+            'title': self.title,
+            'language': self.language,
+            'visibility': self.visibility,
+            'theme': self.theme,
+            'source_code': self.source_code,
+        }
+        if self.tags:
+            _snippet['tags'] = self.tags.split(',')
         if self.visibility == 2:
             _snippet['pass_code'] = self.pass_code
+        _snippet['mode'] = get_language(self.language)['mode']
+        return _snippet
 
+    def library_item(self):
+        # GET /snippets/my, no source code, passcodes stay on the edit view
+        _snippet = {
+            'id': self.id,
+            'uid': self.uid,
+            'title': self.title,
+            '_lang': self.language,
+            'language': get_language(self.language)['name'],
+            'visibility': self.visibility,
+            'owner': self.user.name,
+        }
+        if self.tags:
+            _snippet['tags'] = self.tags.split(',')
         _snippet['created_at'] = str(self.created_at)
         _snippet['updated_at'] = str(self.updated_at)
         return _snippet
+
+
+# full-text search index over title, tags and the words of the source
+# (search_text), kept in sync by the database itself: a generated tsvector
+# column on postgres, a FULLTEXT index on mysql and an external content
+# FTS5 table with triggers on sqlite
+search_ddl = {
+    'postgresql': [
+        """
+        ALTER TABLE snippets ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', replace(coalesce(tags, ''), ',', ' ')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(search_text, '')), 'C')
+        ) STORED
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_snippets_search_vector
+        ON snippets USING GIN (search_vector)
+        """,
+    ],
+    'mysql': [
+        """
+        CREATE FULLTEXT INDEX ft_snippets_search
+        ON snippets (title, tags, search_text)
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS snippets_fts USING fts5(
+            title, tags, search_text, content='snippets', content_rowid='id'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS snippets_fts_insert AFTER INSERT ON snippets BEGIN
+            INSERT INTO snippets_fts (rowid, title, tags, search_text)
+            VALUES (new.id, new.title, new.tags, new.search_text);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS snippets_fts_delete AFTER DELETE ON snippets BEGIN
+            INSERT INTO snippets_fts (snippets_fts, rowid, title, tags, search_text)
+            VALUES ('delete', old.id, old.title, old.tags, old.search_text);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS snippets_fts_update AFTER UPDATE ON snippets BEGIN
+            INSERT INTO snippets_fts (snippets_fts, rowid, title, tags, search_text)
+            VALUES ('delete', old.id, old.title, old.tags, old.search_text);
+            INSERT INTO snippets_fts (rowid, title, tags, search_text)
+            VALUES (new.id, new.title, new.tags, new.search_text);
+        END
+        """,
+    ],
+}
+
+for dialect, statements in search_ddl.items():
+    for statement in statements:
+        event.listen(
+            Snippet.__table__,
+            'after_create',
+            DDL(statement).execute_if(dialect=dialect)
+        )
+
+# the FTS5 table is managed by the DDL above, not by Base.metadata
+snippets_fts = Table(
+    'snippets_fts',
+    MetaData(),
+    Column('rowid', Integer, primary_key=True),
+    Column('snippets_fts', Text),
+    Column('rank', Float),
+)
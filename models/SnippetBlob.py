@@ -0,0 +1,20 @@
+from sqlalchemy import TIMESTAMP, Column, Integer, LargeBinary, String, func
+
+from database import Base
+
+
+class SnippetBlob(Base):
+    """
+    Snippet sources stored out of line by content hash, one row shared by
+    every snippet with the same source, see services/blob_service.py.
+    """
+    __tablename__ = 'snippet_blobs'
+    # sha256 of the utf-8 source
+    hash = Column(String(64), primary_key=True)
+    # marker byte and the source, compressed unless the marker is the one
+    # of the none format, see utils/Codec.py
+    data = Column(LargeBinary, nullable=False)
+    byte_count = Column(Integer, nullable=False)
+    # snippets pointing to the blob, the collector deletes it at zero
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
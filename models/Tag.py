@@ -0,0 +1,30 @@
+from sqlalchemy import (TIMESTAMP, Column, ForeignKey, Index, Integer, String,
+                        Table, func)
+
+from database import Base
+
+snippet_tags = Table(
+    'snippet_tags',
+    Base.metadata,
+    Column(
+        'snippet_id',
+        Integer,
+        ForeignKey('snippets.id', ondelete='CASCADE'),
+        primary_key=True
+    ),
+    Column(
+        'tag_id',
+        Integer,
+        ForeignKey('tags.id', ondelete='CASCADE'),
+        primary_key=True
+    ),
+    # the primary key covers snippet -> tags, this one tag -> snippets
+    Index('ix_snippet_tags_tag_id_snippet_id', 'tag_id', 'snippet_id'),
+)
+
+
+class Tag(Base):
+    __tablename__ = 'tags'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(50), unique=True, nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
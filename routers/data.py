@@ -1,31 +1,33 @@
-from fastapi import APIRouter, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request, status
+from fastapi.responses import Response
 
-from lib.data.languages import languages
-from lib.data.themes import themes
+from lib import catalog
+from utils.helpers import etag_matches
 
 router = APIRouter()
 
+# the catalog only changes with a deploy, clients revalidate with the ETag
+cache_control = 'public, max-age=86400'
 
-@router.get("/data/languages")
-async def get_languages():
-    return JSONResponse(
+
+def catalog_response(request: Request, body: bytes, etag: str):
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(
+        content=body,
         status_code=status.HTTP_200_OK,
-        content={
-            'data': {
-                'languages': languages
-            }
-        }
+        media_type='application/json',
+        headers=headers
     )
 
 
+@router.get("/data/languages")
+async def get_languages(request: Request):
+    return catalog_response(request, catalog.languages_json, catalog.languages_etag)
+
+
 @router.get("/data/themes")
-async def get_themes():
-	return JSONResponse(
-		status_code=status.HTTP_200_OK,
-		content={
-			'data': {
-				'themes': themes
-			}
-		}
-	)
+async def get_themes(request: Request):
+    return catalog_response(request, catalog.themes_json, catalog.themes_etag)
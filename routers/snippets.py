@@ -1,11 +1,13 @@
-from typing import Annotated
+from typing import Annotated, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
-from database import db
-from models.Snippet import Snippet, get_language
+from database import get_db
+from models.Snippet import Snippet
+from models.Tag import snippet_tags
 
 from schemas.SnippetSchema import (
     createSnippetSchema,
@@ -13,58 +15,166 @@ from schemas.SnippetSchema import (
     privateSnippetSchema,
     updateSnippetSchema
 )
-from services.code_review_service import get_response_openai
-from sqlalchemy import desc
-from utils import UID
+from services.code_review_service import get_response_openai, stream_events
+from services import (
+    blob_service,
+    cache_service,
+    count_service,
+    export_service,
+    raw_service,
+    review_admission_service,
+    review_cache_service,
+    review_flight_service
+)
+from services.search_service import get_terms, search
+from services.tag_service import count_tags, get_tag_ids, get_tags, with_tags
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, joinedload, selectinload, with_expression
+from utils import UID, ByteRange, Conditional, Cursor
+from utils.helpers import tags_arr_to_str
 from validators.snippetValidator import (
     validate_snippet,
+    validate_raw_snippet,
     validate_new_snippet,
+    validate_bulk_snippets,
     validate_edit_snippet,
     validate_update_snippet,
     validate_delete_snippet,
 )
 
 
-from middlewares import get_current_user
+from middlewares import get_current_user, get_current_user2
 
 router = APIRouter()
 
-# review a code snippet
+# sort key of the listings, encoded into the opaque pagination cursor
+keyset = (Snippet.created_at, Snippet.id)
+
+# columns a listing page is revalidated with, see utils/Conditional.py
+version_columns = (Snippet.uid, Snippet.created_at, Snippet.updated_at)
+
+
+async def fetch_page(db, query, q, tag, cursor, page, limit, window=False):
+    # one page of a listing as (rows, next_cursor), search results are
+    # ordered by relevance and the rest by recency
+    query, rank = search(with_tags(query, tag), q)
+    sort = keyset if rank is None else (rank, Snippet.id)
+    if window:
+        query = count_service.with_window(query)
+
+    rows = (
+        await db.execute(Cursor.paginate(query, sort, cursor, page, limit))
+    ).all()
+    return Cursor.next_page(rows, sort, limit)
+
+
+async def feed_total(db, rows, cursor, q, tag):
+    if count_service.uses_window(cursor):
+        return rows[0].total
+
+    count_query, _ = search(
+        with_tags(
+            select(func.count(Snippet.id)).where(Snippet.visibility == 1),
+            tag
+        ),
+        q
+    )
+    count_key = (' '.join(get_terms(q)), tuple(sorted(set(tag))))
+    return await count_service.get_total(
+        db, count_query, count_key, any(count_key)
+    )
+
+# review a code snippet, streamed as server-sent events
 @router.post('/snippets/code/review')
-def review_code(
+async def review_code(
     request: Request,
     snippet: reviewSnippetSchema,
-    # user=Depends(get_current_user),
+    user=Depends(get_current_user2),
 ):
-    try:
-        return StreamingResponse(get_response_openai(snippet.source_code, snippet.language), media_type="text/event-stream")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    def start():
+        return review_cache_service.record(
+            key,
+            snippet.language,
+            get_response_openai(snippet.source_code, snippet.language)
+        )
+
+    # identical submissions replay the stored review instead of calling
+    # the model again, or follow the one streaming right now
+    key = review_cache_service.get_key(snippet.source_code, snippet.language)
+    review = await review_cache_service.get(key)
+    flight = None
+    if review is None:
+        flight = review_flight_service.subscribe(key)
+    background = None
+    if review is not None:
+        chunks = review_cache_service.replay(review)
+        cache_status = 'hit'
+    elif flight is not None:
+        chunks = review_flight_service.follow(flight)
+        cache_status = 'coalesced'
+    else:
+        # new upstream calls are rate limited per user, or per client IP
+        # for guests, and wait for a slot, queue events come first
+        client = request.client.host if request.client else 'unknown'
+        identity = f"user:{user['id']}" if user else f'ip:{client}'
+        review_admission_service.limit(identity)
+        ticket = review_admission_service.admit(identity)
+        chunks = review_admission_service.admitted(ticket, key, start)
+        # a client gone before the body started never runs its finally
+        background = BackgroundTask(review_admission_service.abandon, ticket)
+        cache_status = 'miss'
+
+    return StreamingResponse(
+        stream_events(request, chunks),
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+            'X-Review-Cache': cache_status,
+        },
+        background=background
+    )
 
 
 # create a snippet
 @router.post('/snippets')
-def store(
+async def store(
     request: Request,
     snippet: Annotated[createSnippetSchema, Depends(validate_new_snippet)],
     user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        new_snippet = Snippet(
-            uid=UID.generate(),
-            title=snippet.title,
-            source_code=snippet.source_code,
-            language=snippet.language,
-            tags=snippet.tags,
-            visibility=snippet.visibility,
-            pass_code=snippet.pass_code if snippet.pass_code is not None else None,
-            theme=snippet.theme if snippet.theme is not None else 'monokai',
-            user_id=user.get('id')
-        )
-        db.add(new_snippet)
-        db.commit()
-
-        return JSONResponse(
+        # no lookup before the insert, a uid conflict fails the unique
+        # constraint and the snippet is inserted again with a new uid
+        for attempt in range(UID.retries):
+            new_snippet = Snippet(
+                uid=UID.generate(),
+                title=snippet.title,
+                language=snippet.language,
+                tags=tags_arr_to_str(snippet.tags) if snippet.tags else None,
+                tag_list=await get_tags(db, snippet.tags),
+                visibility=snippet.visibility,
+                pass_code=snippet.pass_code if snippet.pass_code is not None else None,
+                theme=snippet.theme if snippet.theme is not None else 'monokai',
+                user_id=user.get('id')
+            )
+            await blob_service.write_source(db, new_snippet, snippet.source_code)
+            db.add(new_snippet)
+            try:
+                await db.commit()
+                break
+            except IntegrityError:
+                await db.rollback()
+                if attempt == UID.retries - 1:
+                    raise
+        count_service.invalidate()
+        await cache_service.invalidate()
+        await db.refresh(new_snippet, ['created_at', 'updated_at', 'user'])
+
+        return ORJSONResponse(
             status_code=status.HTTP_201_CREATED,
             content={
                 'detail': 'Snippet create successfully',
@@ -77,53 +187,204 @@ def store(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# create many snippets at once, invalid items are reported and skipped
+@router.post('/snippets/bulk')
+async def bulk_store(
+    request: Request,
+    items: list = Depends(validate_bulk_snippets),
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    valid = [(index, snippet) for index, snippet, error in items if error is None]
+    errors = [
+        {'index': index, 'detail': error}
+        for index, snippet, error in items if error is not None
+    ]
+    created = []
+
+    try:
+        if valid:
+            names = list(dict.fromkeys(
+                name for _, snippet in valid for name in snippet.tags or []
+            ))
+            # one transaction with a multi-row insert, the uids are made up
+            # front and all of them drawn again on a conflict
+            for attempt in range(UID.retries):
+                try:
+                    sources = await blob_service.write_sources(
+                        db, [snippet.source_code for _, snippet in valid]
+                    )
+                    rows = [
+                        {
+                            'uid': UID.generate(),
+                            'title': snippet.title,
+                            'language': snippet.language,
+                            'tags': tags_arr_to_str(snippet.tags) if snippet.tags else None,
+                            'visibility': snippet.visibility,
+                            'pass_code': snippet.pass_code,
+                            'theme': snippet.theme,
+                            'user_id': user.get('id'),
+                            **source,
+                        }
+                        for (_, snippet), source in zip(valid, sources)
+                    ]
+                    tag_ids = await get_tag_ids(db, names)
+                    await db.execute(insert(Snippet).values(rows))
+                    ids = dict(
+                        (
+                            await db.execute(
+                                select(Snippet.uid, Snippet.id)
+                                .where(Snippet.uid.in_([row['uid'] for row in rows]))
+                            )
+                        ).all()
+                    )
+                    links = [
+                        {'snippet_id': ids[row['uid']], 'tag_id': tag_ids[name]}
+                        for row, (_, snippet) in zip(rows, valid)
+                        for name in snippet.tags or []
+                    ]
+                    if links:
+                        await db.execute(insert(snippet_tags).values(links))
+                    await db.commit()
+                    break
+                except IntegrityError:
+                    await db.rollback()
+                    if attempt == UID.retries - 1:
+                        raise
+
+            count_service.invalidate()
+            await cache_service.invalidate()
+            created = [
+                {'index': index, 'uid': row['uid'], 'title': row['title']}
+                for row, (index, _) in zip(rows, valid)
+            ]
+
+        return ORJSONResponse(
+            status_code=status.HTTP_201_CREATED if created else status.HTTP_422_UNPROCESSABLE_ENTITY,
+            content={
+                'detail': f'{len(created)} snippets created, {len(errors)} failed',
+                'data': {
+                    'snippets': created,
+                    'errors': errors,
+                }
+            }
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # get only your snippets
 @router.get('/snippets/my')
-def get_my_snippets(
+async def get_my_snippets(
     request: Request,
     user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
     q: str = '',
     page: int = 1,
-    limit: int = 10,
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    tag: list[str] = Query(default=[]),
 ):
     try:
-        title_condition = Snippet.title.ilike(f"%{q}%")
-        tag_condition = Snippet.tags.ilike(f"%{q}%")
-
-        snippets = (
-            db.query(Snippet)
-            .filter(
-                Snippet.user_id == user.get('id'),
-                title_condition | tag_condition
+        if Conditional.is_conditional(request):
+            # revalidate with the version columns of the page, the snippets
+            # are only loaded and serialized when it changed
+            rows, next_cursor = await fetch_page(
+                db,
+                select(*version_columns).where(Snippet.user_id == user.get('id')),
+                q, tag, cursor, page, limit
+            )
+            if rows:
+                Conditional.check(
+                    request,
+                    Conditional.snippets_etag('my', rows, next_cursor, user.get('id')),
+                    private=True
+                )
+
+        rows, next_cursor = await fetch_page(
+            db,
+            select(Snippet)
+            .options(
+                joinedload(Snippet.user),
+                defer(Snippet.source_code, raiseload=True),
+                defer(Snippet.source_data, raiseload=True)
             )
-            .order_by(desc(Snippet.created_at))
-            .limit(limit)
-            .offset((page - 1) * limit)
-            .all()
+            .where(Snippet.user_id == user.get('id')),
+            q, tag, cursor, page, limit
         )
+        snippets = [row.Snippet for row in rows]
 
         if len(snippets) == 0:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=404,
                 content={
                     'detail': 'No snippets found',
                 }
             )
 
-        snippets = [snippet.serialize() for snippet in snippets]
-        # filer only the title, tags, language, visibility, created_at, updated_at
-        for snippet in snippets:
-            del snippet['source_code']
-            if snippet['visibility'] == 2:
-                del snippet['pass_code']
-            del snippet['theme']
+        etag = Conditional.snippets_etag('my', snippets, next_cursor, user.get('id'))
+
+        snippets = [snippet.library_item() for snippet in snippets]
 
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={
                 'detail': 'Snipppets fetched successfully',
                 'data': {
-                    'snippets': snippets
+                    'snippets': snippets,
+                    'next_cursor': next_cursor
+                }
+            },
+            headers=Conditional.headers(etag, private=True)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# export your whole library, one snippet per line or one file per snippet
+@router.get('/snippets/my/export')
+async def export_my_snippets(
+    user=Depends(get_current_user),
+    format: Literal['ndjson', 'zip'] = 'ndjson',
+):
+    # the body is streamed in chunks as the cursor is read, the length
+    # is unknown up front so the transfer is chunked
+    if format == 'zip':
+        content = export_service.zip_archive(user.get('id'))
+        media_type = 'application/zip'
+    else:
+        content = export_service.ndjson(user.get('id'))
+        media_type = 'application/x-ndjson'
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={
+            'Content-Disposition': f'attachment; filename="snippets-{user.get("username")}.{format}"',
+            'Cache-Control': 'private, no-store',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
+# get the number of public snippets per tag
+@router.get('/snippets/tags')
+async def get_tag_counts(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    limit: int = 50,
+):
+    try:
+        tags = await count_tags(db, limit)
+
+        return ORJSONResponse(
+            status_code=200,
+            content={
+                'detail': 'Tags fetched successfully',
+                'data': {
+                    'tags': tags
                 }
             }
         )
@@ -133,103 +394,185 @@ def get_my_snippets(
 
 # get all public snippets
 @router.get('/snippets')
-def index(
+async def index(
     request: Request,
+    db: AsyncSession = Depends(get_db),
     q: str = '',
     page: int = 1,
-    limit: int = 10,
+    limit: int = Query(default=10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    tag: list[str] = Query(default=[]),
 ):
+    # pages of the feed are served from the response cache between writes
+    cache_key = cache_service.feed_key(get_terms(q), sorted(set(tag)), page, cursor, limit)
+    cached = await cache_service.get('feed', cache_key)
+    if cached is not None:
+        body, headers = cached
+        Conditional.check_headers(request, headers)
+        return Response(content=body, media_type='application/json', headers=headers)
+
     try:
-        title_condition = Snippet.title.ilike(f"%{q}%")
-        tag_condition = Snippet.tags.ilike(f"%{q}%")
-
-        total_count = (
-            db.query(Snippet)
-            .filter(
-                Snippet.visibility == 1,
-                title_condition | tag_condition
+        window = count_service.uses_window(cursor)
+        total_count = None
+        if Conditional.is_conditional(request):
+            # revalidate with the version columns of the page, the snippets
+            # are only loaded and serialized when it changed
+            rows, next_cursor = await fetch_page(
+                db,
+                select(*version_columns).where(Snippet.visibility == 1),
+                q, tag, cursor, page, limit, window
             )
-            .count()
-        )
-
-        snippets = (
-            db.query(Snippet)
-            .filter(
-                Snippet.visibility == 1,
-                title_condition | tag_condition
+            if rows:
+                total_count = await feed_total(db, rows, cursor, q, tag)
+                Conditional.check(
+                    request,
+                    Conditional.snippets_etag('feed', rows, next_cursor, total_count)
+                )
+
+        rows, next_cursor = await fetch_page(
+            db,
+            select(Snippet)
+            .options(
+                joinedload(Snippet.user),
+                defer(Snippet.source_code, raiseload=True),
+                defer(Snippet.source_data, raiseload=True),
+                with_expression(Snippet.source_preview, Snippet.preview_expression())
             )
-            .order_by(desc(Snippet.created_at))
-            .limit(limit)
-            .offset((page - 1) * limit)
-            .all()
+            .where(Snippet.visibility == 1),
+            q, tag, cursor, page, limit, window
         )
+        snippets = [row.Snippet for row in rows]
 
         if len(snippets) == 0:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=404,
                 content={
                     'detail': 'No snippets found',
                 }
             )
 
-        snippets = [snippet.serialize() for snippet in snippets]
-        for snippet in snippets:
-            del snippet['id']
-            del snippet['visibility']
-            del snippet['updated_at']
-            snippet['mode'] = get_language(snippet['_lang'])['mode']
-            del snippet['_lang']
-            snippet['source_code'] = snippet['source_code'][:200] if len(
-                snippet['source_code']) > 200 else snippet['source_code']
-
-        return JSONResponse(
+        if total_count is None:
+            total_count = await feed_total(db, rows, cursor, q, tag)
+        etag = Conditional.snippets_etag('feed', snippets, next_cursor, total_count)
+
+        snippets = [snippet.feed_item() for snippet in snippets]
+
+        headers = Conditional.headers(etag)
+        response = ORJSONResponse(
             status_code=200,
             content={
                 'detail': 'Snipppets fetched successfully',
                 'data': {
                     'snippets': snippets,
-                    'total': total_count
+                    'total': total_count,
+                    'next_cursor': next_cursor
                 }
-            }
+            },
+            headers=headers
         )
+        await cache_service.put('feed', cache_key, response.body, headers)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 # get a single snippet
 @router.get('/snippets/{uid}')
-def show(request: Request, snippet: Snippet = Depends(validate_snippet)):
+async def show(
+    request: Request,
+    uid: str,
+    user=Depends(get_current_user2),
+    db: AsyncSession = Depends(get_db),
+):
+    # public snippets are served from the response cache while unchanged
+    cached = await cache_service.get('snippet', uid)
+    if cached is not None:
+        body, headers = cached
+        Conditional.check_headers(request, headers)
+        return Response(content=body, media_type='application/json', headers=headers)
+
+    snippet = await validate_snippet(request, uid, db, user)
     try:
-        _snippet = snippet.serialize()
-        del _snippet['id']
-        del _snippet['visibility']
-        del _snippet['updated_at']
-        _snippet['mode'] = get_language(_snippet['_lang'])['mode']
-        del _snippet['_lang']
-
-        return JSONResponse(
+        _snippet = snippet.detail()
+
+        headers = Conditional.headers(
+            Conditional.snippets_etag('snippet', [snippet]),
+            Conditional.modified_at(snippet),
+            private=snippet.visibility == 2
+        )
+        response = ORJSONResponse(
             status_code=200,
             content={
                 'detail': 'Snipppet fetched successfully',
                 'data': {
                     'snippet': _snippet
                 }
-            }
+            },
+            headers=headers
         )
+        if snippet.visibility == 1:
+            await cache_service.put('snippet', uid, response.body, headers)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# plain text of a snippet for curl, editors and scripts, without the JSON
+# envelope, a byte range of it with Range
+@router.api_route('/snippets/{uid}/raw', methods=['GET', 'HEAD'])
+async def show_raw(
+    request: Request,
+    version=Depends(validate_raw_snippet),
+):
+    etag = Conditional.snippets_etag('raw', [version])
+    last_modified = Conditional.modified_at(version)
+    headers = {
+        **Conditional.headers(etag, last_modified, private=version.visibility == 2),
+        'Accept-Ranges': 'bytes',
+        # user content, browsers must not sniff it into a page
+        'X-Content-Type-Options': 'nosniff',
+    }
+
+    start, end = 0, version.size
+    status_code = status.HTTP_200_OK
+    # HEAD describes the whole body, like a GET without Range
+    if request.method == 'GET' and Conditional.if_range(request, etag, last_modified):
+        byte_range = ByteRange.parse(request.headers.get('range'), version.size)
+        if byte_range is not None:
+            start, end = byte_range
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            headers['Content-Range'] = ByteRange.content_range(start, end, version.size)
+    headers['Content-Length'] = str(end - start)
+
+    if request.method == 'HEAD':
+        return Response(status_code=status_code, media_type=raw_service.media_type, headers=headers)
+    return StreamingResponse(
+        raw_service.read(version, start, end),
+        status_code=status_code,
+        media_type=raw_service.media_type,
+        headers=headers
+    )
+
+
 # get a private snippet with passcode
 @router.post('/snippets/private/{uid}')
-def show_private_snippet(request: Request, uid: str, form_data: privateSnippetSchema):
+async def show_private_snippet(
+    request: Request,
+    uid: str,
+    form_data: privateSnippetSchema,
+    db: AsyncSession = Depends(get_db),
+):
     try:
-        snippet = db.query(Snippet).filter(
-            Snippet.uid == uid
-        ).first()
+        snippet = await db.scalar(
+            select(Snippet)
+            .options(joinedload(Snippet.user))
+            .where(Snippet.uid == uid)
+        )
 
         if snippet is None:
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=404,
                 content={
                     'detail': 'Snippets not found',
@@ -237,21 +580,16 @@ def show_private_snippet(request: Request, uid: str, form_data: privateSnippetSc
             )
 
         if (snippet.pass_code != form_data.pass_code):
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=403,
                 content={
                     'detail': 'Access denied, provide the correct passcode'
                 }
             )
 
-        _snippet = snippet.serialize()
-        del _snippet['id']
-        del _snippet['visibility']
-        del _snippet['updated_at']
-        _snippet['mode'] = get_language(_snippet['_lang'])['mode']
-        del _snippet['_lang']
+        _snippet = snippet.detail()
 
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={
                 'detail': 'Snipppet fetched successfully',
@@ -266,24 +604,15 @@ def show_private_snippet(request: Request, uid: str, form_data: privateSnippetSc
 
 # edit a single snippet
 @router.get('/snippets/{uid}/edit')
-def edit(
+async def edit(
     request: Request,
     uid: str,
     snippet: Snippet = Depends(validate_edit_snippet)
 ):
     try:
-        _snippet = snippet.serialize()
-        del _snippet['id']
-        del _snippet['created_at']
-        del _snippet['updated_at']
-        del _snippet['owner']
+        _snippet = snippet.edit_view()
 
-        _snippet['mode'] = get_language(_snippet['_lang'])['mode']
-        _snippet['language'] = _snippet['_lang']
-
-        del _snippet['_lang']
-
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={
                 'detail': 'Snipppet fetched successfully',
@@ -298,31 +627,40 @@ def edit(
 
 # update a snippet
 @router.put('/snippets/{uid}')
-def update(
+async def update(
     request: Request,
     uid: str,
     snippet: Annotated[updateSnippetSchema, Depends(validate_update_snippet)],
-    user=Depends(get_current_user)
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        existing_snippet = db.query(Snippet).filter(Snippet.uid == uid).first()
+        existing_snippet = await db.scalar(
+            select(Snippet)
+            .options(selectinload(Snippet.tag_list))
+            .where(Snippet.uid == uid)
+        )
 
         if snippet.title is not None:
-            snippet.title = snippet.title.strip()
+            existing_snippet.title = snippet.title
         if snippet.source_code is not None:
-            existing_snippet.source_code = snippet.source_code
+            await blob_service.write_source(db, existing_snippet, snippet.source_code)
         if snippet.language is not None:
             existing_snippet.language = snippet.language
         if snippet.tags is not None:
-            existing_snippet.visibility = snippet.visibility
+            existing_snippet.tags = tags_arr_to_str(snippet.tags) if snippet.tags else None
+            existing_snippet.tag_list = await get_tags(db, snippet.tags)
         if snippet.visibility is not None:
+            existing_snippet.visibility = snippet.visibility
             existing_snippet.pass_code = snippet.pass_code
         if snippet.theme is not None:
             existing_snippet.theme = snippet.theme
 
-        db.commit()
+        await db.commit()
+        count_service.invalidate()
+        await cache_service.invalidate(uid)
 
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={
                 'detail': 'Snippet updated successfully'
@@ -334,21 +672,25 @@ def update(
 
 # delete a snippet
 @router.delete('/snippets/{uid}')
-def destroy(
+async def destroy(
     request: Request,
     uid: str,
     user=Depends(get_current_user),
-    snippet: Snippet = Depends(validate_delete_snippet)
+    snippet: Snippet = Depends(validate_delete_snippet),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        db.delete(snippet)
-        db.commit()
-
-        return JSONResponse(
-            status_code=204,
-            content={
-                'detail': 'Snippet deleted successfully',
-            }
+        await db.execute(
+            delete(snippet_tags).where(snippet_tags.c.snippet_id == snippet.id)
         )
+        if snippet.blob_hash is not None:
+            await blob_service.release(db, snippet.blob_hash)
+        await db.delete(snippet)
+        await db.commit()
+        count_service.invalidate()
+        await cache_service.invalidate(snippet.uid)
+
+        # a 204 carries no body, one breaks the keep-alive connection
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
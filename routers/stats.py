@@ -0,0 +1,44 @@
+from fastapi import APIRouter, status
+from fastapi.responses import ORJSONResponse
+
+from database import pool_stats
+from services import cache_service, review_admission_service, review_flight_service
+
+router = APIRouter()
+
+
+@router.get("/stats/pool")
+async def get_pool_stats():
+    return ORJSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            'data': {
+                'pool': pool_stats()
+            }
+        }
+    )
+
+
+@router.get("/stats/cache")
+async def get_cache_stats():
+    return ORJSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            'data': {
+                'cache': cache_service.stats()
+            }
+        }
+    )
+
+
+@router.get("/stats/reviews")
+async def get_review_stats():
+    return ORJSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            'data': {
+                'reviews': review_flight_service.stats(),
+                'admission': review_admission_service.stats()
+            }
+        }
+    )
@@ -5,11 +5,12 @@ from typing import Annotated
 import httpx
 from dotenv import load_dotenv
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from passlib.exc import UnknownHashError
-from sqlalchemy import and_
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import db
+from database import get_db
 from models.User import User
 from schemas.UserSchema import (
     createUserSchema,
@@ -108,7 +109,7 @@ router = APIRouter()
 
 # Login using Google OAuth
 @router.post('/users/auth/google-login')
-def google_oauth_login(form_data: callbackSchema):
+async def google_oauth_login(form_data: callbackSchema, db: AsyncSession = Depends(get_db)):
     data = {
         "code": form_data.code,
         "client_id": environ.get('GOOGLE_CLIENT_ID'),
@@ -117,27 +118,30 @@ def google_oauth_login(form_data: callbackSchema):
         "grant_type": "authorization_code",
     }
 
-    response = httpx.post("https://oauth2.googleapis.com/token", data=data)
-    print(response.json())
-    if response.status_code == 200:
-        access_token = response.json()["access_token"]
+    async with httpx.AsyncClient() as client:
+        response = await client.post("https://oauth2.googleapis.com/token", data=data)
+        if response.status_code == 200:
+            access_token = response.json()["access_token"]
 
-        userinfo_response = httpx.get(
-            "https://www.googleapis.com/oauth2/v3/userinfo",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
+            userinfo_response = await client.get(
+                "https://www.googleapis.com/oauth2/v3/userinfo",
+                headers={"Authorization": f"Bearer {access_token}"}
+            )
 
+    if response.status_code == 200:
         if userinfo_response.status_code == 200:
             userinfo = userinfo_response.json()
 
             response_message = 'Login successful'
             try:
-                user = db.query(User).filter(
-                    and_(
-                        User.email == userinfo.get("email"),
-                        User.google_auth == 1
+                user = await db.scalar(
+                    select(User).where(
+                        and_(
+                            User.email == userinfo.get("email"),
+                            User.google_auth == 1
+                        )
                     )
-                ).first()
+                )
 
                 if not user:
                     try:
@@ -149,7 +153,10 @@ def google_oauth_login(form_data: callbackSchema):
                         )
 
                         db.add(user)
-                        db.commit()
+                        await db.commit()
+                        await db.refresh(user)
+                        # databases reusing ids may still cache a former user's tokens
+                        Auth.invalidate_user(user.id)
                         response_message = 'Welcome to Codeglimpse!'
                     except Exception as e:
                         raise HTTPException(
@@ -158,7 +165,7 @@ def google_oauth_login(form_data: callbackSchema):
                         )
 
                 access_token = Auth.create_access_token(
-                    data={'sub': user.email}
+                    data=Auth.user_claims(user)
                 )
                 refresh_token = Auth.create_refresh_token(
                     data={'sub': user.email}
@@ -166,7 +173,7 @@ def google_oauth_login(form_data: callbackSchema):
 
                 _user = user.serialize()
                 _user['picture'] = userinfo.get('picture')
-                response = JSONResponse(
+                response = ORJSONResponse(
                     status_code=status.HTTP_200_OK,
                     content={
                         'detail': response_message,
@@ -215,8 +222,8 @@ def google_oauth_login(form_data: callbackSchema):
 
 # refresh token
 @router.post('/users/auth/refreshtoken')
-def refresh_token(request: Request):
-    token_exception = JSONResponse(
+async def refresh_token(request: Request, db: AsyncSession = Depends(get_db)):
+    token_exception = ORJSONResponse(
         status_code=status.HTTP_400_BAD_REQUEST,
         content={'detail': 'Unauthorized'},
         headers={'WWW-Authenticate': 'Bearer'},
@@ -232,7 +239,7 @@ def refresh_token(request: Request):
         email = payload.get('sub')
         if not email:
             raise token_exception
-        user = db.query(User).filter(User.email == email).first()
+        user = await db.scalar(select(User).where(User.email == email))
         if not user:
             raise token_exception
 
@@ -242,9 +249,9 @@ def refresh_token(request: Request):
         return token_exception
 
     try:
-        access_token = Auth.create_access_token(data={'sub': user.email})
+        access_token = Auth.create_access_token(data=Auth.user_claims(user))
 
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_200_OK,
             content={
                 'detail': 'Authentication successful',
@@ -270,8 +277,19 @@ def refresh_token(request: Request):
 
 # Logout
 @router.post('/users/auth/logout')
-def logout(request: Request):
-    response = JSONResponse(
+async def logout(request: Request):
+    # the access token sent along stops being served from the cache
+    token = request.headers.get('Authorization')
+    if token is not None and token.startswith('Bearer '):
+        try:
+            payload = Auth.decode_access_token(token.replace('Bearer ', ''))
+            if 'uid' in payload:
+                Auth.invalidate_user(payload['uid'])
+        except HTTPException:
+            # expired or invalid, nothing cached for it
+            pass
+
+    response = ORJSONResponse(
         status_code=status.HTTP_200_OK,
         content={
             'detail': 'Logout successful',
@@ -76,6 +76,11 @@ class createSnippetSchema(BaseModel):
         return value
 
 
+class bulkSnippetSchema(BaseModel):
+    # items are checked one by one, see validate_bulk_snippets
+    snippets: list[dict]
+
+
 class updateSnippetSchema(BaseModel):
     title: Optional[str] = None
     source_code: Optional[str] = None
@@ -0,0 +1,160 @@
+"""
+Content-addressed storage of snippet sources. A source of SNIPPETS_BLOB_MIN
+characters or more is written once to snippet_blobs under the sha256 of
+its text, and every snippet with that source points to the same blob, so
+forks, re-shares and pasted boilerplate are stored once. The blob holds
+the source compressed by the codec when one is set (see utils/Codec.py),
+plain otherwise. Shorter sources stay inline in snippets.source_code, a
+row of their own would cost more than a copy.
+
+Blobs count the snippets pointing to them: the routes take a reference
+when a source is written and release the one of the source it replaces
+or deletes. Blobs released to zero are deleted by the collector, which
+can also recount the references from the snippets:
+
+    python -m services.blob_service --recount
+"""
+import argparse
+import hashlib
+from os import environ
+
+from sqlalchemy import create_engine, delete, exists, func, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm.attributes import set_committed_value
+
+from database import connection_string, db_connection
+from models.Snippet import Snippet
+from models.SnippetBlob import SnippetBlob
+from utils import Codec
+
+# characters from which a source is stored in a blob
+min_length = int(environ.get('SNIPPETS_BLOB_MIN', 256))
+
+
+def get_hash(source_code):
+    return hashlib.sha256(source_code.encode()).hexdigest()
+
+
+def get_columns(source_code):
+    """
+    Stored columns of a source as (columns, blob), blob being the row to
+    reference in snippet_blobs or None when the source stays inline.
+    """
+    columns = Snippet.source_columns(source_code)
+    if len(source_code) < min_length:
+        return columns, None
+
+    blob = {
+        'hash': get_hash(source_code),
+        'data': Codec.encode(source_code),
+        'byte_count': columns['byte_count'],
+    }
+    columns.update(source_text='', blob_hash=blob['hash'])
+    return columns, blob
+
+
+def upsert(blobs):
+    """
+    One statement inserting the blobs or raising the count of the ones
+    already stored, safe against a concurrent writer of the same source.
+    blobs are snippet_blobs rows with the references they take.
+    """
+    if db_connection == 'mysql':
+        statement = mysql.insert(SnippetBlob).values(blobs)
+        return statement.on_duplicate_key_update(
+            ref_count=SnippetBlob.ref_count + statement.inserted.ref_count
+        )
+
+    dialect = sqlite if db_connection == 'sqlite' else postgresql
+    statement = dialect.insert(SnippetBlob).values(blobs)
+    return statement.on_conflict_do_update(
+        index_elements=[SnippetBlob.hash],
+        set_={'ref_count': SnippetBlob.ref_count + statement.excluded.ref_count}
+    )
+
+
+def count_references(blobs):
+    # one row per distinct blob, holding the references taken on it
+    counted = {}
+    for blob in blobs:
+        if blob['hash'] in counted:
+            counted[blob['hash']]['ref_count'] += 1
+        else:
+            counted[blob['hash']] = {**blob, 'ref_count': 1}
+    return list(counted.values())
+
+
+async def write_source(db, snippet, source_code):
+    """
+    Sets the source of a new or loaded snippet, taking a reference on its
+    blob and releasing the one of the source it replaces.
+    """
+    previous = snippet.blob_hash
+    columns, blob = get_columns(source_code)
+    if blob is not None:
+        await db.execute(upsert(count_references([blob])))
+
+    for column, value in columns.items():
+        setattr(snippet, column, value)
+    # what the row reads once written, without loading it again
+    set_committed_value(snippet, 'source_data', blob and blob['data'])
+
+    if previous is not None:
+        await release(db, previous)
+
+
+async def write_sources(db, sources):
+    """
+    Stored columns of many new sources, references taken in one statement.
+    """
+    stored = [get_columns(source_code) for source_code in sources]
+    blobs = [blob for _, blob in stored if blob is not None]
+    if blobs:
+        await db.execute(upsert(count_references(blobs)))
+    return [columns for columns, _ in stored]
+
+
+async def release(db, blob_hash):
+    await db.execute(
+        update(SnippetBlob)
+        .where(SnippetBlob.hash == blob_hash)
+        .values(ref_count=SnippetBlob.ref_count - 1)
+    )
+
+
+def recount(connection):
+    # repairs counts left wrong by writes that bypassed the service
+    connection.execute(
+        update(SnippetBlob).values(
+            ref_count=select(func.count(Snippet.id))
+            .where(Snippet.blob_hash == SnippetBlob.hash)
+            .scalar_subquery()
+        )
+    )
+
+
+def collect(connection):
+    """
+    Deletes the blobs no snippet points to. The count and the snippets are
+    both checked, a blob referenced again meanwhile is kept.
+    """
+    return connection.execute(
+        delete(SnippetBlob)
+        .where(
+            SnippetBlob.ref_count <= 0,
+            ~exists().where(Snippet.blob_hash == SnippetBlob.hash)
+        )
+    ).rowcount
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--recount', action='store_true', help='recount the references first')
+    args = parser.parse_args()
+
+    engine = create_engine(connection_string)
+    with engine.begin() as connection:
+        if args.recount:
+            recount(connection)
+        deleted = collect(connection)
+    print(f'{deleted} orphan blobs deleted')
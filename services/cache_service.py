@@ -0,0 +1,285 @@
+"""
+Cache of rendered public responses: single snippets keyed by uid in the
+'snippet' namespace, feed pages keyed by their normalized filter and page
+in the 'feed' namespace. Entries are the response body plus its headers.
+
+RESPONSE_CACHE picks the backend:
+    memory - LRU in each process, bounded by RESPONSE_CACHE_SIZE entries
+             and RESPONSE_CACHE_BYTES bytes, a write only invalidates the
+             process serving it so the other workers may serve the old
+             entry for up to RESPONSE_CACHE_TTL seconds
+    redis  - any server speaking the Redis protocol at REDIS_URL, shared
+             by all the workers, memory is bounded by the server
+    off    - no caching
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from os import environ
+from urllib.parse import urlparse
+
+backend_name = environ.get('RESPONSE_CACHE', 'memory').lower()
+cache_ttl = int(environ.get('RESPONSE_CACHE_TTL', 60))
+cache_size = int(environ.get('RESPONSE_CACHE_SIZE', 1024))
+cache_bytes = int(environ.get('RESPONSE_CACHE_BYTES', 16 * 1024 * 1024))
+redis_url = environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+
+counters = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'errors': 0}
+
+# bumped by every invalidation, a response read from the database before a
+# write of this process committed is not stored
+generation = 0
+_read_generation = ContextVar('read_generation', default=None)
+
+
+def pack(body, headers):
+    return json.dumps(headers, separators=(',', ':')).encode() + b'\n' + body
+
+
+def unpack(data):
+    headers, body = data.split(b'\n', 1)
+    return body, json.loads(headers)
+
+
+class MemoryBackend:
+    def __init__(self, size, max_bytes, ttl):
+        self.size = size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        # (namespace, key) -> (expires_at, data)
+        self.entries = OrderedDict()
+
+    def _pop(self, entry_key):
+        _, data = self.entries.pop(entry_key)
+        self.bytes -= len(data)
+
+    async def get(self, namespace, key):
+        entry_key = (namespace, key)
+        entry = self.entries.get(entry_key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._pop(entry_key)
+            return None
+        self.entries.move_to_end(entry_key)
+        return entry[1]
+
+    async def set(self, namespace, key, data):
+        if len(data) > self.max_bytes:
+            return
+
+        entry_key = (namespace, key)
+        if entry_key in self.entries:
+            self._pop(entry_key)
+        self.entries[entry_key] = (time.monotonic() + self.ttl, data)
+        self.bytes += len(data)
+
+        while len(self.entries) > self.size or self.bytes > self.max_bytes:
+            self._pop(next(iter(self.entries)))
+            counters['evictions'] += 1
+
+    async def delete(self, namespace, key=None):
+        if key is not None:
+            if (namespace, key) in self.entries:
+                self._pop((namespace, key))
+            return
+
+        for entry_key in [k for k in self.entries if k[0] == namespace]:
+            self._pop(entry_key)
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.bytes}
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend:
+    """
+    Minimal Redis protocol client. Single snippets are plain keys with an
+    expiry, the feed is one hash so a write drops every page with a DEL.
+    """
+
+    def __init__(self, url, ttl, pool_size=10):
+        url = urlparse(url)
+        self.host = url.hostname or '127.0.0.1'
+        self.port = url.port or 6379
+        self.db = int(url.path.lstrip('/') or 0)
+        self.password = url.password
+        self.ttl = ttl
+        self.pool_size = pool_size
+        # idle connections as (loop, reader, writer)
+        self.idle = []
+
+    @staticmethod
+    def encode(*args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    @classmethod
+    async def read_reply(cls, reader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError('connection closed by the server')
+        prefix, rest = line[:1], line[1:-2]
+        if prefix == b'+':
+            return rest
+        if prefix == b'-':
+            raise RedisError(rest.decode())
+        if prefix == b':':
+            return int(rest)
+        if prefix == b'$':
+            if int(rest) < 0:
+                return None
+            return (await reader.readexactly(int(rest) + 2))[:-2]
+        if prefix == b'*':
+            if int(rest) < 0:
+                return None
+            return [await cls.read_reply(reader) for _ in range(int(rest))]
+        raise RedisError(f'unexpected reply {line!r}')
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        # connections belong to the event loop they were opened on, the
+        # ones of another (or a closed) loop are dropped
+        while self.idle:
+            connection = self.idle.pop()
+            if connection[0] is loop and not connection[2].is_closing():
+                return connection
+
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        connection = (loop, reader, writer)
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            await self.send(connection, *setup)
+        return connection
+
+    async def send(self, connection, *commands):
+        _, reader, writer = connection
+        writer.write(b''.join(self.encode(*command) for command in commands))
+        await writer.drain()
+        return [await self.read_reply(reader) for _ in commands]
+
+    async def execute(self, *commands):
+        # pipelines the commands on one pooled connection
+        connection = await self.connect()
+        try:
+            replies = await self.send(connection, *commands)
+        except BaseException:
+            connection[2].close()
+            raise
+        if len(self.idle) < self.pool_size:
+            self.idle.append(connection)
+        else:
+            connection[2].close()
+        return replies
+
+    async def get(self, namespace, key):
+        if namespace == 'feed':
+            return (await self.execute(('HGET', 'cache:feed', key)))[0]
+        return (await self.execute(('GET', f'cache:{namespace}:{key}')))[0]
+
+    async def set(self, namespace, key, data):
+        if namespace == 'feed':
+            await self.execute(
+                ('HSET', 'cache:feed', key, data),
+                ('EXPIRE', 'cache:feed', self.ttl)
+            )
+        else:
+            await self.execute(('SET', f'cache:{namespace}:{key}', data, 'EX', self.ttl))
+
+    async def delete(self, namespace, key=None):
+        if namespace == 'feed':
+            await self.execute(('DEL', 'cache:feed'))
+        elif key is not None:
+            await self.execute(('DEL', f'cache:{namespace}:{key}'))
+
+    def stats(self):
+        return {'host': self.host, 'port': self.port, 'idle_connections': len(self.idle)}
+
+
+def create_backend(name):
+    if name == 'memory':
+        return MemoryBackend(cache_size, cache_bytes, cache_ttl)
+    if name == 'redis':
+        return RedisBackend(redis_url, cache_ttl)
+    return None
+
+
+backend = create_backend(backend_name)
+
+
+def configure(name):
+    global backend, backend_name
+    backend_name = name
+    backend = create_backend(name)
+
+
+# the cache is an optimization, a failing backend counts an error and the
+# request carries on as a miss
+
+async def get(namespace, key):
+    if backend is None:
+        return None
+    try:
+        data = await backend.get(namespace, key)
+    except (OSError, RedisError, asyncio.IncompleteReadError):
+        counters['errors'] += 1
+        data = None
+
+    if data is None:
+        counters['misses'] += 1
+        _read_generation.set(generation)
+        return None
+    counters['hits'] += 1
+    return unpack(data)
+
+
+async def put(namespace, key, body, headers):
+    if backend is None or _read_generation.get() != generation:
+        return
+    try:
+        await backend.set(namespace, key, pack(body, headers))
+        counters['sets'] += 1
+    except (OSError, RedisError, asyncio.IncompleteReadError):
+        counters['errors'] += 1
+
+
+async def invalidate(uid=None):
+    # every write drops the feed pages, updates and deletes also the snippet
+    global generation
+    generation += 1
+    if backend is None:
+        return
+    try:
+        await backend.delete('feed')
+        if uid is not None:
+            await backend.delete('snippet', uid)
+    except (OSError, RedisError, asyncio.IncompleteReadError):
+        counters['errors'] += 1
+
+
+def feed_key(terms, tags, page, cursor, limit):
+    return json.dumps([terms, tags, page, cursor, limit], separators=(',', ':'))
+
+
+def stats():
+    lookups = counters['hits'] + counters['misses']
+    return {
+        'backend': backend_name,
+        **counters,
+        'hit_ratio': round(counters['hits'] / lookups, 4) if lookups else None,
+        **(backend.stats() if backend is not None else {}),
+    }
@@ -1,32 +1,161 @@
-import openai
+"""
+Code reviews streamed from the chat completions API to the browser as
+server-sent events.
+
+The upstream call goes through a pooled httpx.AsyncClient, so a review
+holds a socket and no thread while it streams. Every frame is a JSON
+'data:' line: {"content": ...} per token, an 'error' event when the
+upstream call fails and a final 'done' event. Comment lines keep idle
+connections open and the upstream request is closed as soon as the
+client disconnects.
+"""
+import asyncio
+import json
+import weakref
 from os import environ
-from fastapi import FastAPI, HTTPException
+from typing import NamedTuple
 
-# Load your API key from an environment variable or secret management service
-openai.api_key = environ.get('OPENAI_API_KEY')
+import anyio
+import httpx
 
+api_base = environ.get('OPENAI_API_BASE', 'https://api.openai.com/v1').rstrip('/')
+api_key = environ.get('OPENAI_API_KEY')
+model = environ.get('OPENAI_MODEL', 'gpt-3.5-turbo-0613')
 
-def get_response_openai(source_code, language):
-    try:
-        instructions = 'Do an in-depth code review, and improve comments, no additionl documentaion after or bvefore the code, just rewrite the code precisely.'
-
-        messages = [
-            {'role': 'system', 'content': 'You are an experienced software engineer reviewing a random code snippet.'},
-            {'role': 'system', 'content': f'Code snippet is in {language}.'},
-            {'role': 'user', 'content': source_code},
-            {'role': 'user', 'content': instructions}
-        ]
-        response = openai.ChatCompletion.create(
-            model='gpt-3.5-turbo-0613',
-            messages=messages,
-            stream=True
+# seconds to connect and to wait for the next upstream chunk
+connect_timeout = float(environ.get('REVIEW_CONNECT_TIMEOUT', 10))
+read_timeout = float(environ.get('REVIEW_READ_TIMEOUT', 60))
+# seconds of upstream silence before a keepalive comment is sent
+keepalive_interval = float(environ.get('REVIEW_KEEPALIVE', 15))
+max_connections = int(environ.get('REVIEW_MAX_CONNECTIONS', 100))
+
+instructions = 'Do an in-depth code review, and improve comments, no additionl documentaion after or bvefore the code, just rewrite the code precisely.'
+
+# one client per event loop, its pooled connections can't be shared
+_clients = weakref.WeakKeyDictionary()
+
+
+class ReviewError(Exception):
+    pass
+
+
+class Event(NamedTuple):
+    # a named frame between the text chunks, e.g. the queue position
+    name: str
+    data: dict
+
+
+def get_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            base_url=api_base,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections // 5 or 1
+            ),
         )
-        # print(response)
-    except Exception as e:
-        # print("Error in creating campaigns from OpenAI:", str(e))
-        raise HTTPException(503, detail=str(e))
-
-    for chunk in response:
-        choice_delta = chunk["choices"][0]["delta"]
-        current_content = choice_delta.get("content", "")
-        yield current_content
+        _clients[loop] = client
+    return client
+
+
+def get_messages(source_code, language):
+    return [
+        {'role': 'system', 'content': 'You are an experienced software engineer reviewing a random code snippet.'},
+        {'role': 'system', 'content': f'Code snippet is in {language}.'},
+        {'role': 'user', 'content': source_code},
+        {'role': 'user', 'content': instructions}
+    ]
+
+
+async def get_response_openai(source_code, language):
+    # yields the review text as the upstream streams it
+    async with get_client().stream(
+        'POST',
+        '/chat/completions',
+        headers={'Authorization': f'Bearer {api_key}'},
+        json={
+            'model': model,
+            'messages': get_messages(source_code, language),
+            'stream': True,
+        },
+    ) as response:
+        if response.status_code != 200:
+            await response.aread()
+            raise ReviewError(
+                f'review service answered {response.status_code}: {response.text[:200]}'
+            )
+
+        async for line in response.aiter_lines():
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                return
+            content = json.loads(data)['choices'][0]['delta'].get('content')
+            if content:
+                yield content
+
+        # a cut stream is no review, it must not end as one (nor be cached)
+        raise ReviewError('review service closed the stream early')
+
+
+def frame(data, event=None):
+    lines = f'event: {event}\n' if event else ''
+    return f'{lines}data: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+keepalive = ': keepalive\n\n'
+
+
+async def stream_events(request, chunks):
+    """
+    SSE frames for an async iterator of text chunks, an Event in between
+    goes out as a frame of its own. The iterator is read
+    by a separate task, so keepalives go out while it waits upstream and
+    cancelling the stream (Starlette does on disconnect) closes it.
+    """
+    queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                await queue.put(('chunk', chunk))
+            await queue.put(('done', None))
+        except asyncio.CancelledError:
+            raise
+        except (httpx.HTTPError, ReviewError, ValueError, LookupError) as e:
+            await queue.put(('error', str(e) or type(e).__name__))
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                kind, value = await asyncio.wait_for(queue.get(), keepalive_interval)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield keepalive
+                continue
+
+            if kind == 'chunk' and isinstance(value, Event):
+                yield frame(value.data, event=value.name)
+            elif kind == 'chunk':
+                yield frame({'content': value})
+            elif kind == 'error':
+                yield frame({'detail': value}, event='error')
+                break
+            else:
+                yield frame({}, event='done')
+                break
+    finally:
+        # stops the upstream read and releases its connection, shielded
+        # since Starlette cancels the whole response on disconnect
+        with anyio.CancelScope(shield=True):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,72 @@
+import json
+import time
+from collections import OrderedDict
+from os import environ
+
+from sqlalchemy import func, text
+
+from database import db_postgres
+
+# how GET /snippets computes its total, per deployment:
+#   exact     - a separate COUNT(*) over the filtered snippets
+#   window    - COUNT(*) OVER() on the page query itself, exact count for
+#               cursor requests since the seek predicate would shrink it
+#   cached    - exact count cached per normalized filter for COUNT_CACHE_TTL
+#               seconds and dropped on every snippet write
+#   estimated - planner estimate for the unfiltered feed on postgres,
+#               cached counts otherwise
+strategy = environ.get('COUNT_STRATEGY', 'exact').lower()
+cache_ttl = float(environ.get('COUNT_CACHE_TTL', 60))
+cache_size = int(environ.get('COUNT_CACHE_SIZE', 1024))
+
+# key -> (expires_at, total)
+_cache = OrderedDict()
+
+
+def invalidate():
+    _cache.clear()
+
+
+def uses_window(cursor):
+    return strategy == 'window' and not cursor
+
+
+def with_window(query):
+    return query.add_columns(func.count().over().label('total'))
+
+
+async def get_cached(db, count_query, key):
+    now = time.monotonic()
+    entry = _cache.get(key)
+    if entry and entry[0] > now:
+        return entry[1]
+
+    total = await db.scalar(count_query)
+    _cache[key] = (now + cache_ttl, total)
+    _cache.move_to_end(key)
+    while len(_cache) > cache_size:
+        _cache.popitem(last=False)
+    return total
+
+
+async def get_estimate(db):
+    plan = await db.scalar(
+        text('EXPLAIN (FORMAT JSON) SELECT 1 FROM snippets WHERE visibility = 1')
+    )
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+async def get_total(db, count_query, key, filtered):
+    """
+    Total of the feed for the configured strategy. key identifies the
+    normalized filter, filtered tells whether it restricts the feed.
+    """
+    if strategy == 'estimated' and not filtered and db_postgres:
+        return await get_estimate(db)
+
+    if strategy in ('cached', 'estimated'):
+        return await get_cached(db, count_query, key)
+
+    return await db.scalar(count_query)
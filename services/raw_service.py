@@ -0,0 +1,110 @@
+"""
+Plain text of a snippet for GET /snippets/{uid}/raw. The headers are
+answered from the version columns alone, so HEAD, 304 and 416 responses
+never read the source. The body is read once they are sent, a chunk of
+RAW_CHUNK_SIZE bytes at a time: the database cuts the requested bytes of
+inline sources, blobs are decompressed a chunk at a time and only the
+requested bytes are kept.
+"""
+from os import environ
+
+import anyio.lowlevel
+from sqlalchemy import LargeBinary, cast, func, select
+
+from database import db_postgres, open_session
+from models.Snippet import Snippet
+from models.SnippetBlob import SnippetBlob
+from utils import Codec
+
+chunk_size = int(environ.get('RAW_CHUNK_SIZE', 65536))
+
+# starlette adds the charset, utf-8, to text media types
+media_type = 'text/plain'
+
+
+def as_bytes(column):
+    # utf-8 bytes of a text column, substr() and length() then count bytes.
+    # postgres reads backslashes of a text cast to bytea as escapes
+    if db_postgres:
+        return func.convert_to(column, 'UTF8')
+    return cast(column, LargeBinary)
+
+
+async def get_version(db, uid):
+    # rows from before the preview columns have no byte_count, a blob
+    # always knows the size of its source
+    return (
+        await db.execute(
+            select(
+                Snippet.uid,
+                Snippet.visibility,
+                Snippet.user_id,
+                Snippet.created_at,
+                Snippet.updated_at,
+                Snippet.blob_hash,
+                func.coalesce(
+                    Snippet.byte_count,
+                    select(SnippetBlob.byte_count)
+                    .where(SnippetBlob.hash == Snippet.blob_hash)
+                    .scalar_subquery(),
+                    func.length(as_bytes(Snippet.source_text))
+                ).label('size'),
+            ).where(Snippet.uid == uid)
+        )
+    ).first()
+
+
+def same_version(version):
+    # the row the headers were answered from
+    return (
+        Snippet.uid == version.uid,
+        Snippet.blob_hash.is_(None),
+        Snippet.updated_at.is_(None) if version.updated_at is None
+        else Snippet.updated_at == version.updated_at,
+    )
+
+
+async def read_inline(db, version, start, end):
+    for offset in range(start, end, chunk_size):
+        chunk = await db.scalar(
+            select(func.substr(
+                as_bytes(Snippet.source_text), offset + 1, min(chunk_size, end - offset)
+            ))
+            .where(*same_version(version))
+        )
+        if chunk is None:
+            # edited or deleted since the headers were sent, the client
+            # sees the body end short of its Content-Length
+            raise RuntimeError(f'snippet {version.uid} changed while it was sent')
+        yield bytes(chunk)
+
+
+async def read_blob(db, version, start, end):
+    # a blob is never changed, the one named by the headers is read even
+    # if the snippet was edited since
+    data = await db.scalar(select(SnippetBlob.data).where(SnippetBlob.hash == version.blob_hash))
+    if data is None:
+        raise RuntimeError(f'snippet {version.uid} changed while it was sent')
+    offset = 0
+    for chunk in Codec.decompress_chunks(data, chunk_size):
+        if offset + len(chunk) > start:
+            yield chunk[max(start - offset, 0):end - offset]
+        offset += len(chunk)
+        if offset >= end:
+            break
+        await anyio.lowlevel.checkpoint()
+
+
+async def read(version, start, end):
+    """
+    The bytes start to end, end excluded, of the source of the snippet the
+    version row was read from.
+    """
+    # the body is streamed after the request dependencies are done
+    async with open_session() as db:
+        if version.blob_hash is None:
+            chunks = read_inline(db, version, start, end)
+        else:
+            chunks = read_blob(db, version, start, end)
+        async for chunk in chunks:
+            yield chunk
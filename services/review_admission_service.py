@@ -0,0 +1,231 @@
+"""
+Admission control of the code reviews.
+
+Every review request spends a token of its user (or client IP) bucket,
+refilled at REVIEW_RATE per minute up to REVIEW_BURST, an empty bucket
+answers 429. At most REVIEW_CONCURRENCY reviews call the model at once,
+the others wait in a queue served round-robin across users, so one user
+can't starve the rest. Cached and coalesced reviews spend no token and
+take no slot. REVIEW_QUEUE_SIZE bounds the queue (503 when full),
+REVIEW_QUEUE_PER_USER the waiting reviews of one user (429). Both
+rejections carry Retry-After.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from os import environ
+
+from fastapi import HTTPException, status
+
+from services import review_flight_service
+from services.code_review_service import Event
+
+concurrency = int(environ.get('REVIEW_CONCURRENCY', 8))
+queue_size = int(environ.get('REVIEW_QUEUE_SIZE', 64))
+queue_per_user = int(environ.get('REVIEW_QUEUE_PER_USER', 2))
+rate = float(environ.get('REVIEW_RATE', 6)) / 60
+burst = float(environ.get('REVIEW_BURST', 3))
+buckets_size = 10000
+
+# identity -> (tokens, updated_at)
+buckets = OrderedDict()
+
+running = 0
+# identity -> deque of waiting tickets, in round-robin order
+waiting = OrderedDict()
+# seconds a review holds its slot, moving average seeded with a guess
+average_duration = float(environ.get('REVIEW_EXPECTED_DURATION', 20))
+
+counters = {'admitted': 0, 'waited': 0, 'rate_limited': 0, 'rejected': 0}
+
+
+class Ticket:
+    def __init__(self, identity):
+        self.identity = identity
+        self.granted = False
+        self.released = False
+        # set once the upstream call took over the slot
+        self.held = False
+        self.started_at = None
+        self.changed = asyncio.Event()
+
+    def grant(self):
+        global running
+        running += 1
+        self.granted = True
+        self.started_at = time.monotonic()
+        self.changed.set()
+
+    def release(self):
+        global running, average_duration
+        if self.released:
+            return
+        self.released = True
+
+        if self.granted:
+            running -= 1
+            duration = time.monotonic() - self.started_at
+            average_duration += (duration - average_duration) * 0.2
+        else:
+            tickets = waiting.get(self.identity)
+            if tickets is not None and self in tickets:
+                tickets.remove(self)
+                if not tickets:
+                    del waiting[self.identity]
+        schedule()
+
+
+def schedule():
+    # grants free slots round-robin across the waiting users
+    while running < concurrency and waiting:
+        identity, tickets = next(iter(waiting.items()))
+        ticket = tickets.popleft()
+        if tickets:
+            waiting.move_to_end(identity)
+        else:
+            del waiting[identity]
+        ticket.grant()
+
+    for tickets in waiting.values():
+        for ticket in tickets:
+            ticket.changed.set()
+
+
+def queued():
+    return sum(len(tickets) for tickets in waiting.values())
+
+
+def position(ticket):
+    # 1-based place of the ticket in the round-robin order
+    tickets = waiting.get(ticket.identity)
+    if tickets is None or ticket not in tickets:
+        return 0
+    index = tickets.index(ticket)
+    ahead = 0
+    for identity, others in waiting.items():
+        ahead += min(len(others), index)
+        if identity == ticket.identity:
+            break
+        if len(others) > index:
+            ahead += 1
+    for identity, others in reversed(waiting.items()):
+        if identity == ticket.identity:
+            break
+        ahead += min(len(others), index)
+    return ahead + 1
+
+
+def estimate(place):
+    # seconds until the review at this place gets a slot
+    return round(math.ceil(place / concurrency) * average_duration, 1)
+
+
+def take_token(identity):
+    now = time.monotonic()
+    tokens, updated_at = buckets.pop(identity, (burst, now))
+    tokens = min(burst, tokens + (now - updated_at) * rate)
+    if tokens < 1:
+        buckets[identity] = (tokens, now)
+        return math.ceil((1 - tokens) / rate)
+
+    buckets[identity] = (tokens - 1, now)
+    while len(buckets) > buckets_size:
+        buckets.popitem(last=False)
+    return 0
+
+
+def reject(status_code, retry_after, detail):
+    raise HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={'Retry-After': str(max(1, math.ceil(retry_after)))}
+    )
+
+
+def limit(identity):
+    retry_after = take_token(identity)
+    if retry_after:
+        counters['rate_limited'] += 1
+        reject(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            retry_after,
+            'Too many reviews, try again later'
+        )
+
+
+def admit(identity):
+    # a ticket holding or waiting for a slot, or an HTTPException
+    ticket = Ticket(identity)
+    if running < concurrency and not waiting:
+        ticket.grant()
+        counters['admitted'] += 1
+        return ticket
+
+    if len(waiting.get(identity, ())) >= queue_per_user:
+        counters['rate_limited'] += 1
+        reject(
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            estimate(position(waiting[identity][0])),
+            'Your previous reviews are still waiting'
+        )
+    if queued() >= queue_size:
+        counters['rejected'] += 1
+        reject(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            estimate(queue_size + 1),
+            'Reviews are busy, try again later'
+        )
+
+    waiting.setdefault(identity, deque()).append(ticket)
+    counters['waited'] += 1
+    return ticket
+
+
+def abandon(ticket):
+    # run once the response ended, the body may never have started: the
+    # slot or the queue place goes back unless the upstream call took it
+    if not ticket.held:
+        ticket.release()
+
+
+async def admitted(ticket, key, start):
+    """
+    Chunks of the review for an admitted ticket: 'queued' events with the
+    position and estimated wait while it waits, then the review. The slot
+    is handed over to the upstream call, so it is freed when the model
+    finished answering, not when this client did.
+    """
+    try:
+        last = None
+        while not ticket.granted:
+            ticket.changed.clear()
+            place = position(ticket)
+            if place != last:
+                last = place
+                yield Event('queued', {'position': place, 'eta': estimate(place)})
+            await ticket.changed.wait()
+
+        if last is not None:
+            yield Event('started', {})
+        flight = review_flight_service.subscribe(key)
+        if flight is not None:
+            # started by an identical review while this one waited
+            ticket.release()
+        else:
+            flight = review_flight_service.launch(key, start(), ticket)
+        async for chunk in review_flight_service.follow(flight):
+            yield chunk
+    finally:
+        abandon(ticket)
+
+
+def stats():
+    return {
+        'running': running,
+        'queued': queued(),
+        'concurrency': concurrency,
+        'queue_size': queue_size,
+        'average_duration': round(average_duration, 2),
+        **counters,
+    }
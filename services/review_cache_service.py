@@ -0,0 +1,148 @@
+"""
+Completed code reviews stored in the reviews table by a hash of the
+normalized source, the language, the prompt and the model, so identical
+submissions are answered without calling the model again.
+
+Reviews expire after REVIEW_CACHE_TTL seconds. Once their content grows
+past REVIEW_CACHE_BYTES, the least recently used ones are evicted. A hit
+is replayed in chunks the size of model deltas, so the browser renders
+it the same way as a live review.
+"""
+import asyncio
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta
+from os import environ
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from database import open_session
+from models.Review import Review
+from services import code_review_service
+
+enabled = environ.get('REVIEW_CACHE', 'true').lower() == 'true'
+ttl = int(environ.get('REVIEW_CACHE_TTL', 7 * 24 * 3600))
+max_bytes = int(environ.get('REVIEW_CACHE_BYTES', 64 * 1024 * 1024))
+# replayed chunks hold up to this many characters, sent this many seconds
+# apart
+replay_chunk = int(environ.get('REVIEW_REPLAY_CHUNK', 16))
+replay_delay = float(environ.get('REVIEW_REPLAY_DELAY', 0))
+
+
+def normalize(source_code):
+    # line endings and trailing whitespace don't change the review
+    lines = source_code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+
+def get_key(source_code, language):
+    # the hash covers the whole request sent upstream
+    request = {
+        'model': code_review_service.model,
+        'messages': code_review_service.get_messages(normalize(source_code), language),
+    }
+    raw = json.dumps(request, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(raw).hexdigest()
+
+
+async def get(key):
+    if not enabled:
+        return None
+    now = datetime.utcnow()
+    try:
+        # a short session of its own, a streaming review never holds a
+        # pooled connection
+        async with open_session() as db:
+            content = await db.scalar(
+                select(Review.content).where(
+                    Review.key == key,
+                    Review.created_at > now - timedelta(seconds=ttl)
+                )
+            )
+            if content is not None:
+                await db.execute(
+                    update(Review)
+                    .where(Review.key == key)
+                    .values(hits=Review.hits + 1, last_used_at=now)
+                )
+                await db.commit()
+            return content
+    except SQLAlchemyError:
+        # the cache is an optimization, a failing store means a miss
+        return None
+
+
+async def put(key, language, content):
+    now = datetime.utcnow()
+    try:
+        async with open_session() as db:
+            await db.execute(
+                delete(Review).where(Review.key == key)
+            )
+            await db.execute(
+                insert(Review).values(
+                    key=key,
+                    model=code_review_service.model,
+                    language=language,
+                    content=content,
+                    byte_count=len(content.encode()),
+                    hits=0,
+                    created_at=now,
+                    last_used_at=now,
+                )
+            )
+            await db.commit()
+            await evict(db, now)
+    except IntegrityError:
+        # stored meanwhile by an identical review
+        pass
+    except SQLAlchemyError:
+        pass
+
+
+async def evict(db, now):
+    await db.execute(
+        delete(Review).where(Review.created_at <= now - timedelta(seconds=ttl))
+    )
+    total = await db.scalar(select(func.coalesce(func.sum(Review.byte_count), 0)))
+    if total > max_bytes:
+        # least recently used first, down to 90% of the budget
+        rows = (
+            await db.execute(
+                select(Review.key, Review.byte_count).order_by(Review.last_used_at)
+            )
+        ).all()
+        keys = []
+        for row in rows:
+            if total <= max_bytes * 0.9:
+                break
+            keys.append(row.key)
+            total -= row.byte_count
+        await db.execute(delete(Review).where(Review.key.in_(keys)))
+    await db.commit()
+
+
+async def record(key, language, chunks):
+    # passes the chunks through and stores the review once it completed,
+    # an error or a disconnect leaves nothing behind
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    if enabled and parts:
+        await put(key, language, ''.join(parts))
+
+
+async def replay(content):
+    # words with their leading whitespace, grouped up to replay_chunk chars
+    chunk = ''
+    for piece in re.findall(r'\s*\S+|\s+', content):
+        if chunk and len(chunk) + len(piece) > replay_chunk:
+            yield chunk
+            chunk = ''
+            await asyncio.sleep(replay_delay)
+        chunk += piece
+    if chunk:
+        yield chunk
@@ -0,0 +1,124 @@
+"""
+Single-flight coalescing of identical code reviews. The first request for
+a review key starts the upstream stream in a task of its own, requests
+for the same key arriving while it runs subscribe to it: they get the
+chunks buffered so far first, then every new chunk as it arrives. The
+upstream call is cancelled once its last subscriber disconnected.
+"""
+import asyncio
+
+from services.code_review_service import ReviewError
+
+# key -> Flight of the reviews streaming right now
+flights = {}
+
+counters = {'started': 0, 'joined': 0, 'cancelled': 0}
+
+
+class Flight:
+    def __init__(self, key):
+        self.key = key
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        # admission ticket of the slot the upstream call holds
+        self.ticket = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        # wakes the subscribers waiting for the next chunk
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+async def run(flight, chunks):
+    try:
+        async for chunk in chunks:
+            flight.chunks.append(chunk)
+            flight.notify()
+    except asyncio.CancelledError:
+        flight.error = 'review cancelled'
+        raise
+    except Exception as e:
+        flight.error = str(e) or type(e).__name__
+    finally:
+        flight.done = True
+        if flights.get(flight.key) is flight:
+            del flights[flight.key]
+        release(flight)
+        flight.notify()
+
+
+def release(flight):
+    if flight.ticket is not None:
+        flight.ticket.release()
+
+
+def subscribe(key):
+    """
+    The review streaming under key with one more subscriber, or None.
+    Taken when the request comes in, so the flight found is the one
+    followed even if it ends before the response starts: its chunks stay
+    buffered on it. A response that never starts leaves its subscriber,
+    the upstream call then runs to its end.
+    """
+    flight = flights.get(key)
+    if flight is not None:
+        flight.subscribers += 1
+        counters['joined'] += 1
+    return flight
+
+
+def launch(key, chunks, ticket):
+    """
+    Starts streaming chunks under key, subscribed once. The admission
+    ticket the upstream call holds is released when the call ends,
+    whoever reads it.
+    """
+    flight = flights[key] = Flight(key)
+    flight.ticket = ticket
+    ticket.held = True
+    flight.subscribers = 1
+    flight.task = asyncio.create_task(run(flight, chunks))
+    counters['started'] += 1
+    return flight
+
+
+async def follow(flight):
+    # chunks of a subscribed flight, the ones buffered so far first
+    try:
+        position = 0
+        while True:
+            if position < len(flight.chunks):
+                position += 1
+                yield flight.chunks[position - 1]
+            elif flight.done:
+                if flight.error:
+                    raise ReviewError(flight.error)
+                return
+            else:
+                await flight.wait()
+    finally:
+        flight.subscribers -= 1
+        if flight.subscribers == 0 and not flight.done:
+            # nobody reads it anymore, free the upstream call, later
+            # requests start a new one
+            if flights.get(flight.key) is flight:
+                del flights[flight.key]
+            flight.task.cancel()
+            # a task cancelled before it ran never reaches its finally
+            release(flight)
+            counters['cancelled'] += 1
+
+
+def stats():
+    return {
+        'in_flight': len(flights),
+        'subscribers': sum(flight.subscribers for flight in flights.values()),
+        **counters,
+    }
@@ -0,0 +1,50 @@
+import re
+
+from sqlalchemy import Double, cast, func, literal_column, type_coerce
+from sqlalchemy.dialects import mysql
+
+from database import db_connection
+from models.Snippet import Snippet, snippets_fts
+
+
+def get_terms(q):
+    # words of the query, each one is matched as a prefix
+    return re.findall(r'[^\W_]+', q.lower())
+
+
+def search(query, q):
+    """
+    Restricts a select over snippets to the ones matching q on title, tags
+    and the words of the source, using the full-text index of the configured database.
+    Returns the query and a relevance expression, higher is better, or
+    (query, None) when q holds nothing searchable.
+    """
+    terms = get_terms(q)
+    if not terms:
+        return query, None
+
+    if db_connection == 'mysql':
+        against = ' '.join(f'+{term}*' for term in terms)
+        match = mysql.match(
+            Snippet.title, Snippet.tags, Snippet.search_text,
+            against=against
+        ).in_boolean_mode()
+        return query.where(match), type_coerce(match, Double)
+
+    if db_connection == 'sqlite':
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        query = (
+            query
+            # + 0 hides the rowid from the FTS5 planner, otherwise it may
+            # walk the visibility index and run the MATCH once per snippet
+            .join(snippets_fts, snippets_fts.c.rowid + 0 == Snippet.id)
+            .where(snippets_fts.c.snippets_fts.op('MATCH')(expression))
+        )
+        # bm25 scores are negative, the best match has the lowest one
+        return query, -snippets_fts.c.rank
+
+    search_vector = literal_column('snippets.search_vector')
+    ts_query = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+    # double precision so the rank survives the round trip through a cursor
+    rank = cast(func.ts_rank(search_vector, ts_query), Double)
+    return query.where(search_vector.op('@@')(ts_query)), rank
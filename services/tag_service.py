@@ -0,0 +1,67 @@
+from sqlalchemy import func, insert, select
+
+from models.Snippet import Snippet
+from models.Tag import Tag, snippet_tags
+
+
+async def get_tags(db, names):
+    # Tag rows for the given names, the missing ones are created
+    if not names:
+        return []
+
+    existing = (await db.scalars(select(Tag).where(Tag.name.in_(names)))).all()
+    tags = {tag.name: tag for tag in existing}
+    for name in names:
+        if name not in tags:
+            tags[name] = Tag(name=name)
+            db.add(tags[name])
+
+    return [tags[name] for name in names]
+
+
+async def get_tag_ids(db, names):
+    # name -> id for the given names, the missing ones are inserted with
+    # a single statement
+    if not names:
+        return {}
+
+    ids = dict((await db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names)))).all())
+    missing = [name for name in dict.fromkeys(names) if name not in ids]
+    if missing:
+        await db.execute(insert(Tag).values([{'name': name} for name in missing]))
+        ids.update(
+            (await db.execute(select(Tag.name, Tag.id).where(Tag.name.in_(missing)))).all()
+        )
+    return ids
+
+
+def with_tags(query, names):
+    # restricts a select over snippets to the ones carrying every tag
+    if not names:
+        return query
+
+    tagged = (
+        select(snippet_tags.c.snippet_id)
+        .join(Tag, Tag.id == snippet_tags.c.tag_id)
+        .where(Tag.name.in_(names))
+        .group_by(snippet_tags.c.snippet_id)
+        .having(func.count() == len(set(names)))
+    )
+    return query.where(Snippet.id.in_(tagged))
+
+
+async def count_tags(db, limit=50):
+    # number of public snippets per tag, most used first
+    count = func.count(snippet_tags.c.snippet_id).label('count')
+    rows = (
+        await db.execute(
+            select(Tag.name, count)
+            .join(snippet_tags, snippet_tags.c.tag_id == Tag.id)
+            .join(Snippet, Snippet.id == snippet_tags.c.snippet_id)
+            .where(Snippet.visibility == 1)
+            .group_by(Tag.name)
+            .order_by(count.desc(), Tag.name)
+            .limit(limit)
+        )
+    ).all()
+    return [{'name': row.name, 'count': row.count} for row in rows]
@@ -1,3 +1,5 @@
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from os import environ
 
@@ -8,6 +10,29 @@ from jose.exceptions import JWTError
 
 load_dotenv()
 
+# recently verified access tokens, token -> (expires_at, user)
+verified_tokens = OrderedDict()
+verified_tokens_ttl = float(environ.get('AUTH_CACHE_TTL', 60))
+verified_tokens_size = int(environ.get('AUTH_CACHE_SIZE', 10000))
+
+# user id -> time of the last change, older tokens carry stale claims.
+# Both dicts live in the process: a change made through one worker is
+# seen by the others only once their cached users expire, after
+# AUTH_CACHE_TTL seconds, and the claims of tokens issued before it are
+# trusted there until the tokens expire
+invalidated_users = {}
+
+
+def user_claims(user):
+    # profile claims carried by access tokens, so requests don't need to
+    # load the user again
+    return {
+        'sub': user.email,
+        'uid': user.id,
+        'name': user.name,
+        'username': user.username,
+    }
+
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -17,7 +42,7 @@ def create_access_token(data: dict):
     )
     expire = datetime.utcnow() + expires_delta if expires_delta else datetime.utcnow()
 
-    to_encode.update({'exp': expire})
+    to_encode.update({'exp': expire, 'iat': datetime.utcnow()})
     encoded_jwt = jwt.encode(
         to_encode,
         environ.get('ACCESS_TOKEN_SECRET'),
@@ -73,3 +98,46 @@ def decode_refresh_token(token):
             detail=str(e),
             headers={"WWW-Authenticate": "Bearer"}
         )
+
+
+def verify_access_token(token):
+    """
+    Decodes an access token and returns the user of its claims, or None
+    when the token predates its claims or a change of the user, so the
+    caller has to load the user itself. Verified users are cached for at
+    most AUTH_CACHE_TTL seconds and never past the expiry of the token.
+    """
+    now = time.time()
+    cached = verified_tokens.get(token)
+    if cached is not None:
+        if cached[0] > now:
+            verified_tokens.move_to_end(token)
+            return cached[1]
+        del verified_tokens[token]
+
+    payload = decode_access_token(token)
+    if 'uid' not in payload or payload.get('iat', 0) <= invalidated_users.get(payload['uid'], 0):
+        return None
+
+    user = {
+        'id': payload['uid'],
+        'name': payload.get('name'),
+        'username': payload.get('username'),
+        'email': payload.get('sub')
+    }
+
+    verified_tokens[token] = (min(now + verified_tokens_ttl, payload['exp']), user)
+    while len(verified_tokens) > verified_tokens_size:
+        verified_tokens.popitem(last=False)
+
+    return user
+
+
+def invalidate_user(user_id):
+    # call when a user changes or logs out, drops the cached tokens of the
+    # user and makes the claims of its current tokens fall back to a
+    # lookup, in this process only
+    invalidated_users[user_id] = time.time()
+    for token, (_, user) in list(verified_tokens.items()):
+        if user['id'] == user_id:
+            del verified_tokens[token]
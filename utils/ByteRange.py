@@ -0,0 +1,42 @@
+from fastapi import HTTPException, status
+
+
+# single byte ranges of the Range request header (RFC 9110, section 14).
+# Several ranges at once are not served, the whole body is sent instead as
+# the RFC allows, and so are malformed ranges
+
+
+def parse(header, size):
+    """
+    (start, end) of the bytes asked for, end excluded, or None when the
+    whole body is sent. Raises 416 when no byte of the range exists.
+    """
+    if not header:
+        return None
+    unit, _, ranges = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+    first, dash, last = ranges.strip().partition('-')
+    if not dash or not (first + last).isdigit():
+        return None
+
+    if first:
+        start = int(first)
+        end = int(last) + 1 if last else size
+        if last and end <= start:
+            return None
+    else:
+        # bytes=-n, the last n bytes
+        start, end = size - min(int(last), size), size
+
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail='Range not satisfiable',
+            headers={'Content-Range': f'bytes */{size}'}
+        )
+    return start, min(end, size)
+
+
+def content_range(start, end, size):
+    return f'bytes {start}-{end - 1}/{size}'
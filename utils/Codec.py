@@ -0,0 +1,121 @@
+import zlib
+from os import environ
+from typing import Callable, Iterator, NamedTuple
+
+try:
+    import zstandard
+except ImportError:  # optional, pip install zstandard for SNIPPETS_COMPRESSION=zstd
+    zstandard = None
+
+# storage codec of snippet sources: a marker byte naming the codec, then the
+# compressed utf-8 bytes. Sources are kept plain when compression is off,
+# when they are short or when compressing would not make them smaller, and
+# rows written with any codec are read whatever the current setting. Plain
+# sources stored in a blob carry the marker of the none format
+codec_name = environ.get('SNIPPETS_COMPRESSION', 'off').lower()
+min_length = int(environ.get('SNIPPETS_COMPRESSION_MIN', 512))
+
+
+class Format(NamedTuple):
+    name: str
+    marker: bytes
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes], bytes]
+    # decompressed bytes in chunks of at most the given size
+    chunks: Callable[[bytes, int], Iterator[bytes]]
+
+
+def _zlib_chunks(data, size):
+    decompressor = zlib.decompressobj()
+    while data:
+        chunk = decompressor.decompress(data, size)
+        data = decompressor.unconsumed_tail
+        if chunk:
+            yield chunk
+    chunk = decompressor.flush()
+    if chunk:
+        yield chunk
+
+
+def _plain(data):
+    return data
+
+
+def _plain_chunks(data, size):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+def _zstd_compress(data):
+    # compressor objects are not thread safe, the sync mode encodes in the
+    # threadpool so each call gets its own
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _zstd_decompress(data):
+    if zstandard is None:
+        raise RuntimeError('reading zstd compressed sources needs the zstandard package')
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _zstd_chunks(data, size):
+    if zstandard is None:
+        raise RuntimeError('reading zstd compressed sources needs the zstandard package')
+    reader = zstandard.ZstdDecompressor().stream_reader(data)
+    while chunk := reader.read(size):
+        yield chunk
+
+
+plain = Format('none', b'\x00', _plain, _plain, _plain_chunks)
+
+formats = {
+    codec.marker: codec
+    for codec in (
+        plain,
+        Format('zlib', b'\x01', zlib.compress, zlib.decompress, _zlib_chunks),
+        Format('zstd', b'\x02', _zstd_compress, _zstd_decompress, _zstd_chunks),
+    )
+}
+# the codecs SNIPPETS_COMPRESSION can name
+formats_by_name = {codec.name: codec for codec in formats.values() if codec is not plain}
+
+if codec_name not in ('off', *formats_by_name):
+    raise RuntimeError(f'unknown SNIPPETS_COMPRESSION {codec_name!r}, use off, zlib or zstd')
+if codec_name == 'zstd' and zstandard is None:
+    raise RuntimeError('SNIPPETS_COMPRESSION=zstd needs the zstandard package')
+
+codec = formats_by_name.get(codec_name)
+
+
+def compress(text):
+    """
+    The stored form of a source, the marker byte and the compressed bytes,
+    or None when it is kept as plain text.
+    """
+    if codec is None or len(text) < min_length:
+        return None
+    data = text.encode()
+    compressed = codec.marker + codec.compress(data)
+    return compressed if len(compressed) < len(data) else None
+
+
+def encode(text):
+    # the stored form of a source in a blob, compressed when worth it
+    return compress(text) or plain.marker + text.encode()
+
+
+def _stored_with(compressed):
+    stored_with = formats.get(compressed[:1])
+    if stored_with is None:
+        raise ValueError(f'unknown source codec marker {compressed[:1]!r}')
+    return stored_with
+
+
+def decompress(compressed):
+    return _stored_with(compressed).decompress(compressed[1:]).decode()
+
+
+def decompress_chunks(compressed, size):
+    # the utf-8 bytes of a source a chunk at a time, a chunk may end in
+    # the middle of a character
+    return _stored_with(compressed).chunks(compressed[1:], size)
@@ -0,0 +1,112 @@
+import hashlib
+import json
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import HTTPException, Request, status
+
+from utils.helpers import etag_matches
+
+
+def modified_at(snippet):
+    # works for Snippet instances and for version-only rows alike
+    return snippet.updated_at or snippet.created_at
+
+
+def etag(*parts):
+    raw = json.dumps(parts, default=str, separators=(',', ':')).encode()
+    return '"' + hashlib.sha256(raw).hexdigest()[:32] + '"'
+
+
+def snippets_etag(kind, snippets, *parts):
+    # validator of a response built from these snippets, any write to one
+    # of them moves its updated_at
+    return etag(kind, [(s.uid, modified_at(s)) for s in snippets], *parts)
+
+
+def http_date(value):
+    # the database keeps naive UTC timestamps
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.replace(microsecond=0), usegmt=True)
+
+
+def is_conditional(request: Request):
+    return (
+        'if-none-match' in request.headers
+        or 'if-modified-since' in request.headers
+    )
+
+
+def is_not_modified(request: Request, etag, last_modified=None):
+    # If-Modified-Since is ignored when If-None-Match is sent
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+def if_range(request: Request, etag, last_modified=None):
+    # a Range is served when If-Range still names the current version,
+    # otherwise the client gets the whole body again
+    value = request.headers.get('if-range')
+    if value is None:
+        return True
+    if value.startswith(('"', 'W/')):
+        # strong comparison, a weak tag never matches
+        return value == etag
+    try:
+        since = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return False
+    if last_modified is None:
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) == since
+
+
+def headers(etag, last_modified=None, private=False):
+    # clients keep the response but revalidate it before every use
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'private, no-cache' if private else 'no-cache',
+    }
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def check(request: Request, etag, last_modified=None, private=False):
+    # answers 304 Not Modified when the client copy is still current
+    if is_not_modified(request, etag, last_modified):
+        raise HTTPException(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=headers(etag, last_modified, private)
+        )
+
+
+def check_headers(request: Request, headers):
+    # check() for a cached response, from the headers it was sent with
+    last_modified = headers.get('Last-Modified')
+    if last_modified is not None:
+        last_modified = parsedate_to_datetime(last_modified)
+    if is_not_modified(request, headers['ETag'], last_modified):
+        raise HTTPException(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=headers
+        )
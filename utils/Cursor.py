@@ -0,0 +1,73 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, desc, or_
+
+
+def encode(*values):
+    values = [
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    ]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode(cursor, columns):
+    # cast every value back to the python type of its sort column
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+
+        decoded = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            if python_type is datetime:
+                decoded.append(datetime.fromisoformat(value))
+            else:
+                decoded.append(python_type(value))
+        return decoded
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail='Invalid cursor'
+        )
+
+
+def seek(columns, values):
+    # rows strictly after (values) in descending (columns) order, the
+    # redundant bound on the leading column lets the index range scan
+    conditions = []
+    for i, column in enumerate(columns):
+        equals = [columns[j] == values[j] for j in range(i)]
+        conditions.append(and_(*equals, column < values[i]))
+    return and_(columns[0] <= values[0], or_(*conditions))
+
+
+def paginate(query, columns, cursor=None, page=1, limit=10):
+    # keyset pagination when a cursor is given, page/offset otherwise, the
+    # sort keys are selected as cursor_0..n and one extra row is fetched
+    # to know whether a next page exists
+    keys = [column.label(f'cursor_{i}') for i, column in enumerate(columns)]
+    query = query.add_columns(*keys).order_by(*[desc(key) for key in keys])
+
+    if cursor:
+        query = query.where(seek(columns, decode(cursor, columns)))
+    else:
+        query = query.offset((max(page, 1) - 1) * limit)
+
+    return query.limit(limit + 1)
+
+
+def next_page(rows, columns, limit=10):
+    # trims the extra row and returns (rows, next_cursor)
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode(*[getattr(last, f'cursor_{i}') for i in range(len(columns))])
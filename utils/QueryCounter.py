@@ -0,0 +1,26 @@
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+# [count] of the request being served, None outside of a counted scope
+current = ContextVar('query_count', default=None)
+
+
+def install(engine):
+    # works for both Engine and AsyncEngine, the events live on the sync one
+    engine = getattr(engine, 'sync_engine', engine)
+    event.listen(engine, 'before_cursor_execute', count)
+
+
+def count(conn, cursor, statement, parameters, context, executemany):
+    counter = current.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def start():
+    # the list is shared with the threadpool and the tasks spawned for the
+    # request, which run on copies of this context
+    counter = [0]
+    current.set(counter)
+    return counter
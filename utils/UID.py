@@ -1,13 +1,59 @@
-from uuid import uuid4
-from database import db
-from models.Snippet import Snippet
+import threading
+import time
+from os import environ, getpid
+
+# snowflake-style ids: 41 bits of milliseconds since the epoch below, 10
+# bits of worker id and a 12 bit sequence per millisecond, written as 13
+# fixed width base36 chars so newer uids also sort after older ones. One
+# case only, the default mysql collations compare uids case-insensitively
+alphabet = '0123456789abcdefghijklmnopqrstuvwxyz'
+length = 13
+epoch = 1672531200000  # 2023-01-01T00:00:00Z
+worker_bits = 10
+sequence_bits = 12
+
+# set UID_WORKER_ID per process when running several workers or hosts, the
+# pid is only a guess, the unique constraint on snippets.uid still catches
+# the rare collision and the insert is retried with a new uid
+worker_id = int(environ.get('UID_WORKER_ID', getpid())) % (1 << worker_bits)
+
+# inserts retried on a uid conflict before giving up
+retries = 3
+
+_lock = threading.Lock()
+_last_ms = 0
+_sequence = 0
+
+
+def _now_ms():
+    return int(time.time() * 1000) - epoch
+
+
+def encode(number):
+    chars = []
+    while number:
+        number, rest = divmod(number, len(alphabet))
+        chars.append(alphabet[rest])
+    return ''.join(reversed(chars)).rjust(length, alphabet[0])
 
 
 def generate():
-    uid = str(uuid4())
-    uid = uid.replace('-', '')
-    uid = uid[:10]
-    snippet = db.query(Snippet).filter(Snippet.uid == uid).first()
-    if snippet:
-        return generate()
-    return uid
+    global _last_ms, _sequence
+
+    with _lock:
+        # never go back in time if the clock is adjusted
+        now = max(_now_ms(), _last_ms)
+        if now == _last_ms:
+            _sequence = (_sequence + 1) & ((1 << sequence_bits) - 1)
+            if _sequence == 0:
+                # sequence exhausted, borrow the next millisecond
+                now += 1
+        else:
+            _sequence = 0
+        _last_ms = now
+
+        return encode(
+            (now << (worker_bits + sequence_bits))
+            | (worker_id << sequence_bits)
+            | _sequence
+        )
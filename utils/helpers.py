@@ -3,3 +3,24 @@ def tags_arr_to_str(tags_arr):
         tags_arr[i] = tags_arr[i].strip()
     tags_str = ','.join(tags_arr)
     return tags_str
+
+
+def clean_tags(tags_arr):
+    # stripped, non blank and unique tag names in their original order,
+    # commas are dropped since the tags column joins the names with them
+    tags = []
+    for tag in tags_arr:
+        tag = tag.replace(',', '').strip()
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def etag_matches(if_none_match, etag):
+    # If-None-Match holds '*' or a list of entity tags, compared weakly
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return etag.removeprefix('W/') in tags
@@ -1,58 +1,159 @@
+from os import environ
+
 from fastapi import Depends, HTTPException, Request, status
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
-from database import db
-from lib.data.languages import languages
-from lib.data.themes import themes
+from database import get_db
+from lib import catalog
 from models.Snippet import Snippet
 from models.User import User
-from schemas.SnippetSchema import createSnippetSchema, updateSnippetSchema
-from utils.helpers import tags_arr_to_str
+from schemas.SnippetSchema import (
+    bulkSnippetSchema,
+    createSnippetSchema,
+    updateSnippetSchema
+)
+from services import raw_service
+from utils import Conditional
+from utils.helpers import clean_tags
 from middlewares import get_current_user, get_current_user2
 
-ext_list = [lang['ext'] for lang in languages]
-theme_list = [theme['value'] for theme in themes]
+# snippets one POST /snippets/bulk may create
+bulk_limit = int(environ.get('SNIPPETS_BULK_LIMIT', 100))
+
+# column sizes, checked here so an item too long for them is rejected on
+# its own instead of failing the insert of the whole batch
+title_length = Snippet.__table__.c.title.type.length
+tags_length = Snippet.__table__.c.tags.type.length
+pass_code_length = Snippet.__table__.c.pass_code.type.length
 
 
 def isOnlyAlphaNeumeric(string: str):
     return string.isalnum() and not string.isalpha() and not string.isnumeric()
 
 
-def validate_new_snippet(
+def validate_tags(tags: list[str]):
+    tags = clean_tags(tags)
+    for tag in tags:
+        if len(tag) > 50:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail='Tags cannot be longer than 50 characters'
+            )
+    if len(','.join(tags)) > tags_length:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f'Tags cannot be longer than {tags_length} characters in total'
+        )
+    return tags
+
+
+def validate_title(title: str):
+    if len(title) > title_length:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f'Title cannot be longer than {title_length} characters'
+        )
+
+
+def validate_pass_code(visibility: int, pass_code: str):
+    if visibility != 2:
+        # not used by public snippets, it only has to fit its column
+        if len(pass_code) > pass_code_length:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f'Pass code cannot be longer than {pass_code_length} characters'
+            )
+        return
+
+    if not isOnlyAlphaNeumeric(pass_code):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail='Invalid pass code'
+        )
+
+    if len(pass_code) != pass_code_length:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f'Pass code should be {pass_code_length} characters'
+        )
+
+
+async def validate_new_snippet(
     request: Request,
     snippet: createSnippetSchema,
     user=Depends(get_current_user)
 ):
+    return check_new_snippet(snippet)
+
+
+def check_new_snippet(snippet: createSnippetSchema):
     snippet.title = snippet.title.strip()
     snippet.source_code = snippet.source_code.strip()
     snippet.language = snippet.language.strip()
+    validate_title(snippet.title)
 
-    if snippet.language not in ext_list:
+    if snippet.language not in catalog.languages_by_ext:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail='Invalid language'
         )
 
-    if snippet.theme not in theme_list:
+    if snippet.theme not in catalog.themes_by_value:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail='Invalid theme'
         )
 
+    if snippet.pass_code is not None:
+        validate_pass_code(snippet.visibility, snippet.pass_code)
+
     if snippet.tags and len(snippet.tags) > 0:
-        snippet.tags = ','.join(snippet.tags)
+        snippet.tags = validate_tags(snippet.tags) or None
     else:
         snippet.tags = None
 
     return snippet
 
 
-def validate_snippet(
+async def validate_bulk_snippets(
     request: Request,
-    uid: str,
-    user=Depends(get_current_user2)
+    payload: bulkSnippetSchema,
+    user=Depends(get_current_user)
 ):
-    snippet = db.query(Snippet).filter(Snippet.uid == uid).first()
-    print(user)
+    """
+    Checks every item like validate_new_snippet, returns (index, snippet,
+    error) per item with either the snippet or the detail of its error so
+    one invalid item doesn't reject the batch.
+    """
+    if not payload.snippets:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail='No snippets given'
+        )
+
+    if len(payload.snippets) > bulk_limit:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f'At most {bulk_limit} snippets can be created at once'
+        )
+
+    items = []
+    for index, item in enumerate(payload.snippets):
+        try:
+            items.append((index, check_new_snippet(createSnippetSchema.model_validate(item)), None))
+        except HTTPException as e:
+            items.append((index, None, e.detail))
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = '.'.join(str(part) for part in error['loc'])
+            items.append((index, None, f'{field}: {error["msg"]}' if field else error['msg']))
+    return items
+
+
+def check_visibility(snippet, user):
     if snippet is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -60,23 +161,79 @@ def validate_snippet(
         )
 
     if snippet.visibility == 2:  # private
-        if user and user.get('id') == snippet.user_id:
-            return snippet
+        if not user or user.get('id') != snippet.user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail='This is a private snippet'
+            )
 
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail='This is a private snippet'
+
+async def validate_snippet(
+    request: Request,
+    uid: str,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user2)
+):
+    if Conditional.is_conditional(request):
+        # revalidations read the version columns only, the snippet itself
+        # is loaded when the client copy is stale
+        version = (
+            await db.execute(
+                select(
+                    Snippet.uid,
+                    Snippet.visibility,
+                    Snippet.user_id,
+                    Snippet.created_at,
+                    Snippet.updated_at
+                ).where(Snippet.uid == uid)
+            )
+        ).first()
+        check_visibility(version, user)
+        Conditional.check(
+            request,
+            Conditional.snippets_etag('snippet', [version]),
+            Conditional.modified_at(version),
+            private=version.visibility == 2
         )
-    else:
-        return snippet
 
+    snippet = await db.scalar(
+        select(Snippet)
+        .options(joinedload(Snippet.user))
+        .where(Snippet.uid == uid)
+    )
+    check_visibility(snippet, user)
+    return snippet
 
-def validate_edit_snippet(
+
+async def validate_raw_snippet(
     request: Request,
     uid: str,
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user2)
+):
+    # the version columns only, the route streams the source itself
+    version = await raw_service.get_version(db, uid)
+    check_visibility(version, user)
+    Conditional.check(
+        request,
+        Conditional.snippets_etag('raw', [version]),
+        Conditional.modified_at(version),
+        private=version.visibility == 2
+    )
+    return version
+
+
+async def validate_edit_snippet(
+    request: Request,
+    uid: str,
+    db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user)
 ):
-    snippet = db.query(Snippet).filter(Snippet.uid == uid).first()
+    snippet = await db.scalar(
+        select(Snippet)
+        .options(joinedload(Snippet.user))
+        .where(Snippet.uid == uid)
+    )
 
     if snippet is None:
         raise HTTPException(
@@ -93,13 +250,14 @@ def validate_edit_snippet(
         )
 
 
-def validate_update_snippet(
+async def validate_update_snippet(
     request: Request,
     uid: str,
     update_snippet: updateSnippetSchema,
+    db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user)
 ):
-    existing_snippet = db.query(Snippet).filter(Snippet.uid == uid).first()
+    existing_snippet = await db.scalar(select(Snippet).where(Snippet.uid == uid))
 
     if existing_snippet is None:
         raise HTTPException(
@@ -115,42 +273,43 @@ def validate_update_snippet(
 
     if update_snippet.title is not None:
         update_snippet.title = update_snippet.title.strip()
+        validate_title(update_snippet.title)
 
     if update_snippet.source_code is not None:
         update_snippet.source_code = update_snippet.source_code.strip()
 
     if update_snippet.language is not None:
         update_snippet.language = update_snippet.language.strip()
-
-    if update_snippet.visibility is not None and update_snippet.visibility == 2 and update_snippet.pass_code is not None:
-        if not isOnlyAlphaNeumeric(update_snippet.pass_code):
+        if update_snippet.language not in catalog.languages_by_ext:
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail='Invalid pass code'
+                detail='Invalid language'
             )
 
-        if len(update_snippet.pass_code) != 6:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail='Pass code should be 6 characters'
-            )
+    if update_snippet.visibility is not None and update_snippet.pass_code is not None:
+        validate_pass_code(update_snippet.visibility, update_snippet.pass_code)
 
     if update_snippet.tags is not None:
-        if len(update_snippet.tags) > 0:
-            update_snippet.tags = tags_arr_to_str(update_snippet.tags)
+        update_snippet.tags = validate_tags(update_snippet.tags)
 
     if update_snippet.theme is not None:
         update_snippet.theme = update_snippet.theme.strip()
+        if update_snippet.theme not in catalog.themes_by_value:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail='Invalid theme'
+            )
 
     return update_snippet
 
 
-def validate_delete_snippet(
+async def validate_delete_snippet(
     request: Request,
     uid: str,
+    db: AsyncSession = Depends(get_db),
     user=Depends(get_current_user)
 ):
-    existing_snippet = db.query(Snippet).filter(Snippet.uid == uid).first()
+    existing_snippet = await db.scalar(select(Snippet).where(Snippet.uid == uid))
 
     if existing_snippet is None:
         raise HTTPException(